@@ -0,0 +1,12 @@
+"""
+Importing the directory as a package gives the headless engine API: from Chess import new_game, play_move, search.
+The modules import each other by bare name, the way python chessmain.py runs them, so this directory is put on
+sys.path first. pygame is only needed by chessmain.
+"""
+import os
+import sys
+
+if os.path.dirname(os.path.abspath(__file__)) not in sys.path:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from engine import find_legal_move, new_game, play_move, search
@@ -0,0 +1,106 @@
+"""
+Offline analysis of many positions. Each FEN or EPD line is searched on its own in a pool of worker processes and the
+results stream back one per line, in input order, as soon as they are ready.
+python batch_analysis.py positions.epd --depth 4 --processes 4 > results.jsonl
+"""
+import argparse
+import json
+import os
+from multiprocessing import Pool
+
+import engine
+from chess_engine import GameState
+
+
+def parse_position(line):
+    """
+    Returns (fen, operations) for a FEN or EPD line, operations is {} for a FEN.
+    """
+    fields = line.split()
+    game_state = GameState()
+    # a FEN has numeric move clocks after the en passant field, an EPD has operations there or nothing
+    if len(fields) == 4 or (len(fields) > 4 and not fields[4].isdigit()):
+        operations = game_state.load_epd(line)
+    else:
+        game_state.load_fen(line)
+        operations = {}
+    return game_state.get_fen(), operations
+
+
+def analyse_position(line, time_limit=None, node_limit=None, depth=None):
+    """
+    Worker entry point, searches one FEN/EPD line and returns a JSON friendly result dict. A line that can't be parsed
+    or searched gives a result with an error instead of stopping the whole batch.
+    """
+    result = {"input": line}
+    try:
+        fen, operations = parse_position(line)
+    except ValueError as error:
+        result["error"] = str(error)
+        return result
+    result["fen"] = fen
+    if "id" in operations:
+        result["id"] = operations["id"]
+    for opcode in ("bm", "am"):
+        if opcode in operations:
+            result[opcode] = operations[opcode]
+    try:
+        search_result = engine.search(engine.new_game(fen), time_limit=time_limit, node_limit=node_limit, depth=depth)
+    except Exception as error:
+        # any failure stays with its own line, the other workers' positions still get searched
+        result["error"] = "%s: %s" % (type(error).__name__, error)
+        return result
+    result["move"] = search_result["notation"]
+    for key in ("score", "depth", "nodes", "time", "pv"):
+        result[key] = search_result[key]
+    return result
+
+
+def analyse_star(args):
+    return analyse_position(*args)
+
+
+def read_positions(lines):
+    # blank lines and # comments are skipped
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def analyse_positions(lines, processes=None, time_limit=None, node_limit=None, depth=None, chunksize=1):
+    """
+    Generator over the analysis of every FEN/EPD line in lines (any iterable of strings, e.g. an open file).
+    Results come back in input order while later positions are still being searched. Every result has the input line
+    and either an error or fen, move, score, depth, nodes, time and pv, plus id/bm/am when the EPD gave them.
+    """
+    processes = processes or os.cpu_count() or 1
+    tasks = ((line, time_limit, node_limit, depth) for line in read_positions(lines))
+    if processes == 1:
+        for task in tasks:
+            yield analyse_star(task)
+        return
+    with Pool(processes) as pool:
+        for result in pool.imap(analyse_star, tasks, chunksize):
+            yield result
+
+
+def analyse_file(path, **search_args):
+    with open(path) as positions:
+        yield from analyse_positions(positions, **search_args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search every position of a FEN/EPD file and print JSON lines.")
+    parser.add_argument("path", help="file with one FEN or EPD position per line")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes, all cores by default")
+    parser.add_argument("--time", type=float, default=None, help="seconds per position")
+    parser.add_argument("--nodes", type=int, default=None, help="node budget per position")
+    parser.add_argument("--depth", type=int, default=None, help="fixed depth, or a depth cap with --time/--nodes")
+    args = parser.parse_args()
+    for result in analyse_file(args.path, processes=args.processes, time_limit=args.time, node_limit=args.nodes, depth=args.depth):
+        print(json.dumps(result), flush=True)
+
+
+if __name__ == "__main__":
+    main()
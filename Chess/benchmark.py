@@ -0,0 +1,162 @@
+"""
+Benchmark runner for the move generator and the search. Every run is saved as JSON together with the commit it was
+measured on, so two commits can be compared with --compare old.json new.json.
+Node counts are deterministic, only the timings change between runs, so a changed count means behaviour changed.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import game_ai
+from chess_engine import GameState
+from perft import PERFT_SUITE, run_perft
+
+PERFT_DEPTH = 3
+SEARCH_DEPTH = 3
+SEARCH_POSITIONS = [
+    ("startpos", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"),
+    ("middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10"),
+    ("endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"),
+]
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def measure_import_time(repeat=5):
+    """
+    Cold import time of the headless engine API in seconds, the best of repeat fresh interpreters.
+    Taken from python -X importtime, so interpreter start up isn't counted.
+    """
+    best = None
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import engine"],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stderr
+        cumulative = 0
+        for line in output.splitlines():
+            fields = line.split("|")
+            if len(fields) == 3 and fields[2].strip() == "engine":
+                cumulative = int(fields[1])
+        if best is None or cumulative < best:
+            best = cumulative
+    return best / 1e6
+
+
+def run_search(fen, depth):
+    """
+    Fixed depth search from a cleared table so the node count only depends on the code.
+    """
+    game_state = GameState(fen=fen)
+    valid_moves = game_state.get_valid_moves()
+    game_ai.get_transposition_table().clear()
+    game_ai.get_transposition_table().new_search()
+    game_ai.move_orderer.history = {}
+    game_ai.move_orderer.new_search()
+    start = time.perf_counter()
+    best_move = game_ai.iterative_deepening(game_state, valid_moves, max_depth=depth)
+    elapsed = time.perf_counter() - start
+    return {
+        "fen": fen,
+        "depth": depth,
+        "move": best_move.get_chess_notation() if best_move is not None else None,
+        "nodes": game_ai.nodes,
+        "time": elapsed,
+        "nps": game_ai.nodes / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def run_benchmark(perft_depth=PERFT_DEPTH, search_depth=SEARCH_DEPTH, report=None):
+    results = {
+        "commit": current_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "import_time": measure_import_time(),
+        "perft": [],
+        "search": [],
+    }
+    for name, fen, expected_counts in PERFT_SUITE:
+        result = run_perft(fen, perft_depth)
+        result["name"] = name
+        if perft_depth in expected_counts:
+            result["passed"] = result["nodes"] == expected_counts[perft_depth]
+        results["perft"].append(result)
+        if report is not None:
+            report("perft", result)
+    for name, fen in SEARCH_POSITIONS:
+        result = run_search(fen, search_depth)
+        result["name"] = name
+        results["search"].append(result)
+        if report is not None:
+            report("search", result)
+    for kind in ("perft", "search"):
+        nodes = sum(result["nodes"] for result in results[kind])
+        elapsed = sum(result["time"] for result in results[kind])
+        results[kind + "_nps"] = nodes / elapsed if elapsed > 0 else 0.0
+    return results
+
+
+def compare(old, new):
+    """
+    Prints the speed change of every benchmark in both runs and warns about node counts that differ.
+    """
+    print("{} -> {}".format(old["commit"], new["commit"]))
+    if "import_time" in old and "import_time" in new:
+        print("import {:.1f}ms -> {:.1f}ms".format(old["import_time"] * 1000, new["import_time"] * 1000))
+    for kind in ("perft", "search"):
+        old_results = {(result["name"], result["depth"]): result for result in old[kind]}
+        for result in new[kind]:
+            old_result = old_results.get((result["name"], result["depth"]))
+            if old_result is None:
+                continue
+            change = result["nps"] / old_result["nps"] - 1 if old_result["nps"] > 0 else 0.0
+            note = "" if result["nodes"] == old_result["nodes"] else "  nodes {} -> {}".format(old_result["nodes"], result["nodes"])
+            print("{:<6} {:<10} {:>10,.0f} -> {:>10,.0f} nps {:+.1%}{}".format(
+                kind, result["name"], old_result["nps"], result["nps"], change, note))
+        old_nps = old.get(kind + "_nps", 0.0)
+        if old_nps > 0:
+            print("{:<6} total  {:+.1%}".format(kind, new[kind + "_nps"] / old_nps - 1))
+
+
+def print_result(kind, result):
+    status = {True: " ok", False: " FAILED"}.get(result.get("passed"), "")
+    print("{:<6} {:<10} depth {} nodes {:>8} {:.2f}s {:,.0f} nps{}".format(
+        kind, result["name"], result["depth"], result["nodes"], result["time"], result["nps"], status))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark perft and search speed and save the results as JSON.")
+    parser.add_argument("--output", help="where to write the results, benchmark-<commit>.json by default")
+    parser.add_argument("--perft-depth", type=int, default=PERFT_DEPTH)
+    parser.add_argument("--search-depth", type=int, default=SEARCH_DEPTH)
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two saved runs instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as old_file, open(args.compare[1]) as new_file:
+            compare(json.load(old_file), json.load(new_file))
+        return
+
+    results = run_benchmark(args.perft_depth, args.search_depth, report=print_result)
+    print("perft  {:,.0f} nps, search {:,.0f} nps, import {:.1f}ms".format(
+        results["perft_nps"], results["search_nps"], results["import_time"] * 1000))
+    output = args.output or "benchmark-{}.json".format(results["commit"])
+    with open(output, "w") as output_file:
+        json.dump(results, output_file, indent=2)
+    print("saved to", output)
+
+
+if __name__ == "__main__":
+    main()
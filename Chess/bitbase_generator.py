@@ -0,0 +1,172 @@
+"""
+Generates the KQK, KRK and KPK bitbases read by bitbases.py. Mates are wins and positions where the weak king takes
+the piece or is stalemated are draws, the rest is solved retrograde style by going over the unsolved positions until
+nothing changes: the strong side wins with any move into a win, the weak side loses once all its moves lead to one,
+and whatever is still open at the end is a draw. Moves follow GameState's rules through the same bitboard tables.
+python bitbase_generator.py --output-dir bitbases
+"""
+import argparse
+import os
+import time
+from array import array
+
+import bitboard
+from bitbases import BITBASE_DIR, MATERIALS, POSITIONS, bitbase_path, is_win, position_index
+
+UNKNOWN = 0
+WON = 1
+DRAWN = 2
+INVALID = 3
+# an index is strong_to_move << 18 | strong_king << 12 | weak_king << 6 | piece, see bitbases.position_index
+WEAK_TO_MOVE = 1 << 18
+PROMOTIONS = ("Q", "R")  # a lone bishop or knight can't win
+
+
+def piece_attacks(piece, sq, occupied):
+    if piece == "Q":
+        return bitboard.rook_attacks(sq, occupied) | bitboard.bishop_attacks(sq, occupied)
+    if piece == "R":
+        return bitboard.rook_attacks(sq, occupied)
+    return bitboard.PAWN_ATTACKS["w"][sq]
+
+
+def add_strong_moves(edges, piece, strong_king, weak_king, piece_sq, occupied, promoted):
+    """
+    Appends the positions the strong side's moves lead to onto edges. Returns True when a pawn promotes into a win
+    according to promoted, {piece: bits} of the bitbases already generated.
+    """
+    king_attacks = bitboard.KING_ATTACKS
+    for dst in bitboard.iter_squares(king_attacks[strong_king] & ~king_attacks[weak_king] & ~(1 << piece_sq)):
+        edges.append(WEAK_TO_MOVE | dst << 12 | weak_king << 6 | piece_sq)
+    if piece != "P":
+        for dst in bitboard.iter_squares(piece_attacks(piece, piece_sq, occupied) & ~occupied):
+            edges.append(WEAK_TO_MOVE | strong_king << 12 | weak_king << 6 | dst)
+        return False
+    dst = piece_sq - 8
+    if occupied >> dst & 1:
+        return False
+    if dst < 8:
+        index = position_index(False, strong_king, weak_king, dst)
+        return any(is_win(bits, index) for bits in promoted.values())
+    edges.append(WEAK_TO_MOVE | strong_king << 12 | weak_king << 6 | dst)
+    if piece_sq >= 48 and not occupied >> (dst - 8) & 1:
+        edges.append(WEAK_TO_MOVE | strong_king << 12 | weak_king << 6 | (dst - 8))
+    return False
+
+
+def solve(status, edges, pending):
+    """
+    Settles the pending (index, first edge, end edge) positions from the values of their successors, pass after pass
+    until one changes nothing. Returns the number of passes.
+    """
+    passes = 0
+    while pending:
+        passes += 1
+        unsolved = []
+        for entry in pending:
+            index, first, end = entry
+            # the side to move picks its best successor, only unknown ones can still change the answer
+            good, bad = (WON, DRAWN) if index < WEAK_TO_MOVE else (DRAWN, WON)
+            result = bad
+            for successor in edges[first:end]:
+                value = status[successor]
+                if value == good:
+                    result = good
+                    break
+                if value == UNKNOWN:
+                    result = UNKNOWN
+            if result == UNKNOWN:
+                unsolved.append(entry)
+            else:
+                status[index] = result
+        if len(unsolved) == len(pending):
+            break
+        pending = unsolved
+    return passes
+
+
+def generate(piece, promoted=None):
+    """
+    Solves king and piece (Q, R or P) against king with the strong side as white. promoted is {piece: bits} of the
+    bitbases a pawn promotes into. Returns the packed win bits and {positions, wins, passes}.
+    """
+    king_attacks = bitboard.KING_ATTACKS
+    status = bytearray(POSITIONS)
+    edges = array("l")
+    pending = []
+    for strong_king in range(64):
+        for weak_king in range(64):
+            kings = 1 << strong_king | 1 << weak_king
+            for piece_sq in range(64):
+                strong_index = strong_king << 12 | weak_king << 6 | piece_sq
+                weak_index = WEAK_TO_MOVE | strong_index
+                piece_bit = 1 << piece_sq
+                if (strong_king == weak_king or king_attacks[strong_king] & kings or piece_bit & kings
+                        or piece == "P" and not 8 <= piece_sq < 56):
+                    status[strong_index] = status[weak_index] = INVALID
+                    continue
+                occupied = kings | piece_bit
+                weak_king_bit = 1 << weak_king
+                # with the strong side to move the weak king can't be in check
+                if piece_attacks(piece, piece_sq, occupied) & weak_king_bit:
+                    status[strong_index] = INVALID
+                else:
+                    first = len(edges)
+                    if add_strong_moves(edges, piece, strong_king, weak_king, piece_sq, occupied, promoted or {}):
+                        status[strong_index] = WON
+                        del edges[first:]
+                    elif len(edges) == first:
+                        status[strong_index] = DRAWN  # stalemated, or only a promotion that doesn't win
+                    else:
+                        pending.append((strong_index, first, len(edges)))
+                attacked = king_attacks[strong_king] | piece_attacks(piece, piece_sq, occupied ^ weak_king_bit)
+                targets = king_attacks[weak_king] & ~attacked
+                if not targets:
+                    status[weak_index] = WON if attacked & weak_king_bit else DRAWN
+                elif targets & piece_bit:
+                    status[weak_index] = DRAWN  # the piece is taken
+                else:
+                    first = len(edges)
+                    for dst in bitboard.iter_squares(targets):
+                        edges.append(strong_king << 12 | dst << 6 | piece_sq)
+                    pending.append((weak_index, first, len(edges)))
+    passes = solve(status, edges, pending)
+    bits = bytearray(POSITIONS // 8)
+    index = status.find(WON)
+    while index != -1:
+        bits[index >> 3] |= 1 << (index & 7)
+        index = status.find(WON, index + 1)
+    stats = {"positions": POSITIONS - status.count(INVALID), "wins": status.count(WON), "passes": passes}
+    return bits, stats
+
+
+def generate_bitbases(directory=BITBASE_DIR, report=None):
+    """
+    Writes every bitbase in MATERIALS into directory. report is called with (piece, stats, seconds) after each one.
+    """
+    os.makedirs(directory, exist_ok=True)
+    solved = {}
+    for piece in MATERIALS:
+        start = time.perf_counter()
+        bits, stats = generate(piece, {promotion: solved[promotion] for promotion in PROMOTIONS if promotion in solved})
+        with open(bitbase_path(piece, directory), "wb") as bitbase_file:
+            bitbase_file.write(bits)
+        solved[piece] = bits
+        if report is not None:
+            report(piece, stats, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the KQK, KRK and KPK endgame bitbases.")
+    parser.add_argument("--output-dir", default=BITBASE_DIR, help="where bitbases.py looks by default")
+    args = parser.parse_args()
+
+    def report(piece, stats, seconds):
+        print("K{}K: {} positions, {} won by the strong side, {} passes, {:.1f}s".format(
+            piece, stats["positions"], stats["wins"], stats["passes"], seconds), flush=True)
+
+    generate_bitbases(args.output_dir, report)
+
+
+if __name__ == "__main__":
+    main()
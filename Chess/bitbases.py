@@ -0,0 +1,93 @@
+"""
+Win/draw endgame bitbases for a king and one queen, rook or pawn against a bare king (KQK, KRK and KPK). Every file
+holds one bit per position, set when the side with the extra piece wins, and is read through mmap so a probe is a
+single byte lookup. The files are generated offline with bitbase_generator.py.
+Positions are stored with the strong side as white, probes for black flip the board from top to bottom.
+"""
+import mmap
+import os
+
+BITBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bitbases")
+# generated in this order, a pawn promotes into the first two
+MATERIALS = ("Q", "R", "P")
+POSITIONS = 2 * 64 * 64 * 64  # side to move, strong king, weak king, piece
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+# piece -> mmap of its file, or None when the file is missing
+bitbase_maps = {}
+
+
+def bitbase_path(piece, directory=None):
+    return os.path.join(directory or BITBASE_DIR, "k%sk.bin" % piece.lower())
+
+
+def position_index(strong_to_move, strong_king, weak_king, piece_sq):
+    return (((0 if strong_to_move else 1) * 64 + strong_king) * 64 + weak_king) * 64 + piece_sq
+
+
+def is_win(bits, index):
+    return (bits[index >> 3] >> (index & 7)) & 1 == 1
+
+
+def load_bitbase(piece):
+    """
+    The mapped bitbase file for piece in BITBASE_DIR, opened on first use, or None when it hasn't been generated.
+    """
+    if piece not in bitbase_maps:
+        path = bitbase_path(piece)
+        bitbase_maps[piece] = None
+        if os.path.exists(path) and os.path.getsize(path) == POSITIONS // 8:
+            with open(path, "rb") as bitbase_file:
+                # the map stays valid once the file is closed
+                bitbase_maps[piece] = mmap.mmap(bitbase_file.fileno(), 0, access=mmap.ACCESS_READ)
+    return bitbase_maps[piece]
+
+
+def close_bitbases():
+    # also forgets missing files, so the next probe looks for them again
+    for bits in bitbase_maps.values():
+        if bits is not None:
+            bits.close()
+    bitbase_maps.clear()
+
+
+def probe(game_state):
+    """
+    WIN, DRAW or LOSS for the side to move, or None when game_state isn't king and one piece against a bare king or
+    that bitbase hasn't been generated.
+    """
+    occupied = game_state.color_bitboards["w"] | game_state.color_bitboards["b"]
+    # clear the two lowest pieces, exactly one must be left
+    occupied &= occupied - 1
+    occupied &= occupied - 1
+    if occupied == 0 or occupied & (occupied - 1):
+        return None
+    bitboards = game_state.bitboards
+    for piece in MATERIALS:
+        for strong in "wb":
+            piece_bits = bitboards[strong + piece]
+            if piece_bits:
+                break
+        else:
+            continue
+        break
+    else:
+        return None  # a minor piece, always a draw but not stored
+    bits = load_bitbase(piece)
+    if bits is None:
+        return None
+    weak = "b" if strong == "w" else "w"
+    strong_king = bitboards[strong + "K"].bit_length() - 1
+    weak_king = bitboards[weak + "K"].bit_length() - 1
+    piece_sq = piece_bits.bit_length() - 1
+    if strong == "b":
+        # rows are the high three bits of a square, flipping them mirrors the board top to bottom
+        strong_king ^= 56
+        weak_king ^= 56
+        piece_sq ^= 56
+    strong_to_move = game_state.white_to_move == (strong == "w")
+    if not is_win(bits, position_index(strong_to_move, strong_king, weak_king, piece_sq)):
+        return DRAW
+    return WIN if strong_to_move else LOSS
@@ -0,0 +1,130 @@
+"""
+Precomputed tables and attack helpers for the bitboard backend.
+Square index is row * 8 + col, so bit 0 is board[0][0] (a8) and bit 63 is board[7][7] (h1).
+"""
+FULL = (1 << 64) - 1
+
+PIECES = ["wP", "wN", "wB", "wR", "wQ", "wK", "bP", "bN", "bB", "bR", "bQ", "bK"]
+
+# (row, col) steps, rook directions first then bishop directions
+DIRECTIONS = ((0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (1, -1), (-1, -1), (-1, 1))
+# a direction is positive when it moves towards higher square indexes
+POSITIVE_DIRECTIONS = (True, True, False, False, True, True, False, False)
+ROOK_DIRECTIONS = (0, 1, 2, 3)
+BISHOP_DIRECTIONS = (4, 5, 6, 7)
+
+
+# (row, col) of every square index, saves a divmod when building moves
+SQUARES = [divmod(sq, 8) for sq in range(64)]
+
+
+def square_bit(row, col):
+    return 1 << (row * 8 + col)
+
+
+def iter_squares(bitboard):
+    while bitboard:
+        bit = bitboard & -bitboard
+        yield bit.bit_length() - 1
+        bitboard ^= bit
+
+
+def step_attacks(steps):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        attacks = 0
+        for d_row, d_col in steps:
+            dst_row = row + d_row
+            dst_col = col + d_col
+            if 0 <= dst_row <= 7 and 0 <= dst_col <= 7:
+                attacks |= square_bit(dst_row, dst_col)
+        table.append(attacks)
+    return table
+
+
+KNIGHT_ATTACKS = step_attacks(((-2, -1), (-2, 1), (2, -1), (2, 1), (-1, -2), (1, -2), (-1, 2), (1, 2)))
+KING_ATTACKS = step_attacks(DIRECTIONS)
+# PAWN_ATTACKS[color][sq] are the squares a pawn of that color on sq attacks
+PAWN_ATTACKS = {
+    "w": step_attacks(((-1, -1), (-1, 1))),
+    "b": step_attacks(((1, -1), (1, 1))),
+}
+
+
+def build_rays():
+    rays = []
+    for d_row, d_col in DIRECTIONS:
+        table = []
+        for sq in range(64):
+            row, col = divmod(sq, 8)
+            ray = 0
+            for i in range(1, 8):
+                dst_row = row + d_row * i
+                dst_col = col + d_col * i
+                if not (0 <= dst_row <= 7 and 0 <= dst_col <= 7):
+                    break
+                ray |= square_bit(dst_row, dst_col)
+            table.append(ray)
+        rays.append(table)
+    return rays
+
+
+RAYS = build_rays()
+ROOK_RAYS = [RAYS[0][sq] | RAYS[1][sq] | RAYS[2][sq] | RAYS[3][sq] for sq in range(64)]
+BISHOP_RAYS = [RAYS[4][sq] | RAYS[5][sq] | RAYS[6][sq] | RAYS[7][sq] for sq in range(64)]
+
+
+def build_between():
+    # BETWEEN[a][b] holds the squares strictly between a and b when they share a line, else 0
+    between = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        for direction in range(8):
+            ray = RAYS[direction][sq]
+            for target in iter_squares(ray):
+                between[sq][target] = ray & ~RAYS[direction][target] & ~(1 << target)
+    return between
+
+
+BETWEEN = build_between()
+
+
+def slider_attacks(sq, occupied, directions):
+    attacks = 0
+    for direction in directions:
+        ray = RAYS[direction][sq]
+        blockers = ray & occupied
+        if blockers:
+            if POSITIVE_DIRECTIONS[direction]:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= RAYS[direction][blocker]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(sq, occupied):
+    return slider_attacks(sq, occupied, ROOK_DIRECTIONS)
+
+
+def bishop_attacks(sq, occupied):
+    return slider_attacks(sq, occupied, BISHOP_DIRECTIONS)
+
+
+def attackers_to(sq, color, bitboards, occupied):
+    """
+    Returns a bitboard of the pieces of color that attack sq given the occupancy.
+    """
+    other = "b" if color == "w" else "w"
+    attackers = PAWN_ATTACKS[other][sq] & bitboards[color + "P"]
+    attackers |= KNIGHT_ATTACKS[sq] & bitboards[color + "N"]
+    attackers |= KING_ATTACKS[sq] & bitboards[color + "K"]
+    queens = bitboards[color + "Q"]
+    rooks = bitboards[color + "R"] | queens
+    if rooks & ROOK_RAYS[sq]:
+        attackers |= rook_attacks(sq, occupied) & rooks
+    bishops = bitboards[color + "B"] | queens
+    if bishops & BISHOP_RAYS[sq]:
+        attackers |= bishop_attacks(sq, occupied) & bishops
+    return attackers
@@ -0,0 +1,79 @@
+"""
+Builds opening book files for opening_book.OpeningBook from PGN game collections. Every move in the first plies of a
+game scores 2 for a win and 1 for a draw of the side that played it, the points add up across games into its weight.
+python book_builder.py games.pgn more_games.pgn --output book.bin --plies 20
+"""
+import argparse
+
+import pgn
+from chess_engine import GameState
+from opening_book import ENTRY
+
+MAX_WEIGHT = 0xFFFF
+DEFAULT_PLIES = 20  # how deep into every game moves are recorded
+# points per game result for the side that played the move, polyglot's make book counts the same way
+RESULT_POINTS = {"win": 2, "draw": 1, "loss": 0}
+
+
+def add_game(weights, tags, san_moves, plies=DEFAULT_PLIES):
+    """
+    Adds the first plies moves of one game to weights, {(key, move_id): points}. Returns False when the game had to be
+    cut short at a move that isn't legal or can't be read.
+    """
+    result = tags.get("Result", "*")
+    game_state = GameState(fen=tags["FEN"]) if "FEN" in tags else GameState()
+    for san in san_moves[:plies]:
+        move = pgn.find_san_move(game_state, san)
+        if move is None:
+            return False
+        if result == "1/2-1/2":
+            points = RESULT_POINTS["draw"]
+        elif result == ("1-0" if game_state.white_to_move else "0-1"):
+            points = RESULT_POINTS["win"]
+        else:
+            points = RESULT_POINTS["loss"]
+        entry = (game_state.zobrist_key, move.move_id)
+        weights[entry] = weights.get(entry, 0) + points
+        game_state.make_move(move)
+    return True
+
+
+def build_book(pgn_paths, output, plies=DEFAULT_PLIES, min_weight=1):
+    """
+    Compiles the games in pgn_paths into a book file at output. Moves below min_weight are left out and weights are
+    scaled down together if the largest doesn't fit in 16 bits. Returns {games, broken_games, entries}.
+    """
+    weights = {}
+    stats = {"games": 0, "broken_games": 0, "entries": 0}
+    for path in pgn_paths:
+        with open(path, encoding="utf-8", errors="replace") as games:
+            for tags, san_moves in pgn.read_games(games):
+                stats["games"] += 1
+                if not add_game(weights, tags, san_moves, plies):
+                    stats["broken_games"] += 1
+    heaviest = max(weights.values(), default=0)
+    scale = MAX_WEIGHT / heaviest if heaviest > MAX_WEIGHT else 1
+    entries = sorted(
+        (key, move_id, max(int(weight * scale), 1)) for (key, move_id), weight in weights.items() if weight >= min_weight
+    )
+    with open(output, "wb") as book:
+        for key, move_id, weight in entries:
+            book.write(ENTRY.pack(key, move_id, weight, 0))
+    stats["entries"] = len(entries)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an opening book from PGN files.")
+    parser.add_argument("pgn", nargs="+", help="PGN files to read")
+    parser.add_argument("--output", default="book.bin")
+    parser.add_argument("--plies", type=int, default=DEFAULT_PLIES, help="moves recorded from the start of every game")
+    parser.add_argument("--min-weight", type=int, default=1, help="leave out moves with fewer points than this")
+    args = parser.parse_args()
+    stats = build_book(args.pgn, args.output, args.plies, args.min_weight)
+    print("{} games ({} cut short), {} entries written to {}".format(
+        stats["games"], stats["broken_games"], stats["entries"], args.output))
+
+
+if __name__ == "__main__":
+    main()
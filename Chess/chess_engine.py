@@ -1,8 +1,70 @@
 """
 Stores all information about current staet of game, It will also be responsible for determining the valid chess moves at current state, also keep a move log.
 """
+from array import array
+
+import bitboard
+import zobrist
+from piece_square_tables import PIECE_VALUES, PIECE_SQUARE_SCORES
+
+# RAY_SQUARES[direction][sq] lists (row, col, bit) of every square from sq to the edge, directions as in bitboard.DIRECTIONS
+RAY_SQUARES = [
+    [
+        [(r + dr * i, c + dc * i, 1 << ((r + dr * i) * 8 + c + dc * i)) for i in range(1, 8) if 0 <= r + dr * i <= 7 and 0 <= c + dc * i <= 7]
+        for r, c in bitboard.SQUARES
+    ]
+    for dr, dc in bitboard.DIRECTIONS
+]
+SLIDER_DIRECTIONS = {"R": bitboard.ROOK_DIRECTIONS, "B": bitboard.BISHOP_DIRECTIONS, "Q": bitboard.ROOK_DIRECTIONS + bitboard.BISHOP_DIRECTIONS}
+
+# castle rights bitmask, same bit order as zobrist.CASTLE_KEYS
+WHITE_KING_SIDE = 1
+BLACK_KING_SIDE = 2
+WHITE_QUEEN_SIDE = 4
+BLACK_QUEEN_SIDE = 8
+ALL_CASTLE_RIGHTS = 15
+# rights that survive a move touching sq, a king or rook leaving home or a rook being captured there
+CASTLE_RIGHTS_KEPT = [ALL_CASTLE_RIGHTS] * 64
+CASTLE_RIGHTS_KEPT[0] ^= BLACK_QUEEN_SIDE
+CASTLE_RIGHTS_KEPT[4] ^= BLACK_KING_SIDE | BLACK_QUEEN_SIDE
+CASTLE_RIGHTS_KEPT[7] ^= BLACK_KING_SIDE
+CASTLE_RIGHTS_KEPT[56] ^= WHITE_QUEEN_SIDE
+CASTLE_RIGHTS_KEPT[60] ^= WHITE_KING_SIDE | WHITE_QUEEN_SIDE
+CASTLE_RIGHTS_KEPT[63] ^= WHITE_KING_SIDE
+
+# undo record layout, one state word and one zobrist key per ply in two preallocated arrays
+#  0-3 captured piece (index into PIECE_CODES), 4-7 castle rights, 8-11 en passant file + 1, 12-31 halfmove clock
+PIECE_CODES = ["--"] + bitboard.PIECES
+PIECE_INDEXES = {piece: i for i, piece in enumerate(PIECE_CODES)}
+UNDO_STACK_SIZE = 512  # grows by doubling if a game ever gets longer
+
+
+def parse_epd_operations(text):
+    """
+    Splits the operations part of an EPD line, like bm Nf3; id "test 1";, into {opcode: operand}.
+    Operands keep their spelling, quotes around a string operand are removed.
+    """
+    operations = {}
+    operation = ""
+    in_quotes = False
+    for char in text + ";":
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ";" and not in_quotes:
+            fields = operation.strip().split(None, 1)
+            if fields:
+                operations[fields[0]] = fields[1].strip() if len(fields) > 1 else ""
+            operation = ""
+            continue
+        operation += char
+    for opcode, operand in operations.items():
+        if operand.startswith('"') and operand.endswith('"') and len(operand) > 1:
+            operations[opcode] = operand[1:-1]
+    return operations
+
+
 class GameState:
-    def __init__(self):
+    def __init__(self, use_bitboards=True, verify_zobrist=False, fen=None):
         self.board = [
             ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
             ["bP", "bP", "bP", "bP", "bP", "bP", "bP", "bP"],
@@ -28,22 +90,152 @@ class GameState:
         self.in_check = False
         self.in_stale_mate = False
         self.in_check_mate = False
-        self.pins = []
+        self.pin_directions = {}  # (row, col) of a pinned piece -> direction from its king towards the pinner
         self.checks = []
-        self.current_castle_right = CastleRights(True, True, True, True)
-        self.castle_rights_log = [CastleRights(self.current_castle_right.wks,self.current_castle_right.wqs,self.current_castle_right.bks,self.current_castle_right.bqs)]
+        self.check_mask = bitboard.FULL  # squares a non king move has to land on, the checker and the squares up to it
+        self.castle_rights = ALL_CASTLE_RIGHTS
         self.enpassant_possible = ()
-        self.enpassant_possible_log = [self.enpassant_possible]
+        self.halfmove_clock = 0  # plies since the last capture or pawn move
+        self.start_ply = 0  # plies played before move_log starts, from the FEN full move number
+        # undo_states[ply] and undo_keys[ply] hold what make_move can't recompute from the move itself
+        self.undo_states = array("L", [0]) * UNDO_STACK_SIZE
+        self.undo_keys = array("Q", [0]) * UNDO_STACK_SIZE
+        # squares the side not to move attacks, stamped with the zobrist key of the position it was computed for
+        self.enemy_attacks = 0
+        self.enemy_attacks_key = None
+        self.use_bitboards = use_bitboards
+        self.init_bitboards()
+        self.init_evaluation()
+        # verify_zobrist recomputes the key from scratch after every make/undo and asserts it matches
+        self.verify_zobrist = verify_zobrist
+        self.zobrist_key = zobrist.compute_key(self)
+        # how often every position key occurred in the game so far, the current position included
+        self.key_counts = {self.zobrist_key: 1}
+        if fen is not None:
+            self.load_fen(fen)
 
-    def square_under_attack(self,r,c):
-        self.white_to_move = not self.white_to_move
-        opp_moves = self.get_possible_moves()
-        self.white_to_move = not self.white_to_move
-        for move in opp_moves:
-            if move.dst_row == r and move.dst_col==c:
+    def init_bitboards(self):
+        self.bitboards = {piece: 0 for piece in bitboard.PIECES}
+        self.color_bitboards = {"w": 0, "b": 0}
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    self.bitboards[piece] |= bitboard.square_bit(r, c)
+                    self.color_bitboards[piece[0]] |= bitboard.square_bit(r, c)
+
+    def init_evaluation(self):
+        # running totals per side in centipawns, set_square keeps them current
+        self.material = {"w": 0, "b": 0}
+        self.piece_square_score = {"w": 0, "b": 0}
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    self.material[piece[0]] += PIECE_VALUES[piece[1]]
+                    self.piece_square_score[piece[0]] += PIECE_SQUARE_SCORES[piece][r * 8 + c]
+
+    def set_square(self, r, c, piece):
+        """
+        Single point of change for the board, keeps the piece bitboards, zobrist key and evaluation totals in step with
+        the board view.
+        """
+        old_piece = self.board[r][c]
+        sq = r * 8 + c
+        bit = 1 << sq
+        if old_piece != "--":
+            color = old_piece[0]
+            self.bitboards[old_piece] ^= bit
+            self.color_bitboards[color] ^= bit
+            self.zobrist_key ^= zobrist.PIECE_KEYS[old_piece][sq]
+            self.material[color] -= PIECE_VALUES[old_piece[1]]
+            self.piece_square_score[color] -= PIECE_SQUARE_SCORES[old_piece][sq]
+        if piece != "--":
+            color = piece[0]
+            self.bitboards[piece] ^= bit
+            self.color_bitboards[color] ^= bit
+            self.zobrist_key ^= zobrist.PIECE_KEYS[piece][sq]
+            self.material[color] += PIECE_VALUES[piece[1]]
+            self.piece_square_score[color] += PIECE_SQUARE_SCORES[piece][sq]
+        self.board[r][c] = piece
+
+    def get_attacked_squares(self, color):
+        """
+        Bitmask (bit row * 8 + col) of every square the pieces of color attack. The other king is taken off the board
+        first, so a square behind it on a checking line still counts as attacked when the king looks for a way out.
+        """
+        board = self.board
+        other_king = ("b" if color == "w" else "w") + "K"
+        pawn_attacks = bitboard.PAWN_ATTACKS[color]
+        attacked = 0
+        for r in range(8):
+            row = board[r]
+            for c in range(8):
+                piece = row[c]
+                if piece[0] != color:
+                    continue
+                sq = r * 8 + c
+                piece_type = piece[1]
+                if piece_type == "P":
+                    attacked |= pawn_attacks[sq]
+                elif piece_type == "N":
+                    attacked |= bitboard.KNIGHT_ATTACKS[sq]
+                elif piece_type == "K":
+                    attacked |= bitboard.KING_ATTACKS[sq]
+                else:
+                    for direction in SLIDER_DIRECTIONS[piece_type]:
+                        for dst_row, dst_col, bit in RAY_SQUARES[direction][sq]:
+                            attacked |= bit
+                            destination_piece = board[dst_row][dst_col]
+                            if destination_piece != "--" and destination_piece != other_king:
+                                break
+        return attacked
+
+    def get_enemy_attacks(self):
+        """
+        Attacked squares map of the side not to move, computed at most once per position.
+        """
+        if self.enemy_attacks_key != self.zobrist_key:
+            self.enemy_attacks = self.get_attacked_squares("b" if self.white_to_move else "w")
+            self.enemy_attacks_key = self.zobrist_key
+        return self.enemy_attacks
+
+    def square_under_attack(self, r, c):
+        enemy_color = "b" if self.white_to_move else "w"
+        if self.use_bitboards:
+            occupied = self.color_bitboards["w"] | self.color_bitboards["b"]
+            return bitboard.attackers_to(r * 8 + c, enemy_color, self.bitboards, occupied) != 0
+        if self.enemy_attacks_key == self.zobrist_key:
+            return (self.enemy_attacks >> (r * 8 + c)) & 1 == 1
+        # no map for this position yet, scanning out from the one square is cheaper than building it
+        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+        for j in range(len(directions)):
+            d = directions[j]
+            for i in range(1, 8):
+                dst_row = r + d[0] * i
+                dst_col = c + d[1] * i
+                if not (0 <= dst_row <= 7 and 0 <= dst_col <= 7):
+                    break
+                piece = self.board[dst_row][dst_col]
+                if piece == "--":
+                    continue
+                if piece[0] == enemy_color:
+                    enemy_type = piece[1]
+                    if (
+                        (j <= 3 and enemy_type in "RQ")
+                        or (j >= 4 and enemy_type in "BQ")
+                        or (i == 1 and enemy_type == "K")
+                        or (i == 1 and enemy_type == "P" and d[0] == (1 if enemy_color == "w" else -1))
+                    ):
+                        return True
+                break
+        for d in ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2)):
+            dst_row = r + d[0]
+            dst_col = c + d[1]
+            if 0 <= dst_row <= 7 and 0 <= dst_col <= 7 and self.board[dst_row][dst_col] == enemy_color + "N":
                 return True
-        return False        
-    
+        return False
+
     def is_in_check(self):
         if self.white_to_move:
             return self.square_under_attack(self.white_king_location[0],self.white_king_location[1])
@@ -51,27 +243,44 @@ class GameState:
             return self.square_under_attack(self.black_king_location[0],self.black_king_location[1])
     
     def make_move(self, move):
-        self.board[move.src_row][move.src_col] = "--"
-        self.board[move.dst_row][move.dst_col] = move.piece_moved
+        ply = len(self.move_log)
+        if ply == len(self.undo_keys):
+            self.undo_states.extend(self.undo_states)
+            self.undo_keys.extend(self.undo_keys)
+        self.undo_states[ply] = (
+            PIECE_INDEXES[move.piece_captured]
+            | self.castle_rights << 4
+            | (self.enpassant_possible[1] + 1 if self.enpassant_possible else 0) << 8
+            | self.halfmove_clock << 12
+        )
+        self.undo_keys[ply] = self.zobrist_key
+        if move.piece_moved[1] == "P" or move.is_capture:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+
+        self.set_square(move.src_row, move.src_col, "--")
+        self.set_square(move.dst_row, move.dst_col, move.piece_moved)
         self.move_log.append(move)
         self.white_to_move = not self.white_to_move
+        self.zobrist_key ^= zobrist.SIDE_KEY ^ zobrist.enpassant_key(self.enpassant_possible) ^ zobrist.CASTLE_KEYS[self.castle_rights]
         if move.piece_moved == "wK":
-            self.white_king_location = (move.dst_row, move.dst_col)
+            self.white_king_location = bitboard.SQUARES[(move.move_id >> 6) & 0x3F]
 
         elif move.piece_moved == "bK":
-            self.black_king_location = (move.dst_row, move.dst_col)
+            self.black_king_location = bitboard.SQUARES[(move.move_id >> 6) & 0x3F]
         
         # Pawn Promotion
         if move.can_promote_pawn:
-            self.board[move.dst_row][move.dst_col] = move.piece_moved[0] + 'Q'
+            self.set_square(move.dst_row, move.dst_col, move.piece_moved[0] + move.promotion_piece)
         
         # enpassant Move
         if move.is_enpassant_move:
-            self.board[move.src_row][move.dst_col] = '--'
+            self.set_square(move.src_row, move.dst_col, '--')
         
         
         if move.piece_moved[1]=='P' and abs(move.src_row - move.dst_row)==2:
-            self.enpassant_possible = ((move.src_row+move.dst_row)//2,move.dst_col)
+            self.enpassant_possible = bitboard.SQUARES[(move.src_row+move.dst_row)//2*8+move.dst_col]
         else:
             self.enpassant_possible = ()
         
@@ -79,100 +288,279 @@ class GameState:
             if move.dst_col - move.src_col==2:
                 # king side castle
                 # moves the rook
-                self.board[move.dst_row][move.dst_col-1] = self.board[move.dst_row][len(self.board[0])-1]
-                self.board[move.dst_row][move.dst_col+1] = '--' #erase old rook
+                self.set_square(move.dst_row, move.dst_col-1, self.board[move.dst_row][move.dst_col+1])
+                self.set_square(move.dst_row, move.dst_col+1, '--') #erase old rook
                 
             else:
                 # queen side castle
                 # moves the rook
-                self.board[move.dst_row][move.dst_col+1] = self.board[move.dst_row][move.dst_col-2]
-                self.board[move.dst_row][move.dst_col-2] = '--'
-        
-        self.enpassant_possible_log.append(self.enpassant_possible)
+                self.set_square(move.dst_row, move.dst_col+1, self.board[move.dst_row][move.dst_col-2])
+                self.set_square(move.dst_row, move.dst_col-2, '--')
         
         self.update_castle_rights(move)
-        self.castle_rights_log.append(CastleRights(self.current_castle_right.wks,self.current_castle_right.wqs,self.current_castle_right.bks,self.current_castle_right.bqs))
+        self.zobrist_key ^= zobrist.enpassant_key(self.enpassant_possible) ^ zobrist.CASTLE_KEYS[self.castle_rights]
+        self.key_counts[self.zobrist_key] = self.key_counts.get(self.zobrist_key, 0) + 1
+        if self.verify_zobrist:
+            self.check_zobrist_key()
         
     def undo_move(self):
         if len(self.move_log) != 0:
             move = self.move_log.pop()
-            self.board[move.src_row][move.src_col] = move.piece_moved
-            self.board[move.dst_row][move.dst_col] = move.piece_captured
+            ply = len(self.move_log)
+            count = self.key_counts[self.zobrist_key]
+            if count == 1:
+                del self.key_counts[self.zobrist_key]
+            else:
+                self.key_counts[self.zobrist_key] = count - 1
+            state = self.undo_states[ply]
+            piece_captured = PIECE_CODES[state & 0xF]
+            self.set_square(move.src_row, move.src_col, move.piece_moved)
+            self.set_square(move.dst_row, move.dst_col, piece_captured)
             self.white_to_move = not self.white_to_move
             
             if move.piece_moved == "wK":
-                self.white_king_location = (move.src_row, move.src_col)
+                self.white_king_location = bitboard.SQUARES[move.move_id & 0x3F]
 
             elif move.piece_moved == "bK":
-                self.black_king_location = (move.src_row, move.src_col)
+                self.black_king_location = bitboard.SQUARES[move.move_id & 0x3F]
 
             # Undo enpassant Move
             if move.is_enpassant_move:
-                self.board[move.dst_row][move.dst_col] = '--'
-                self.board[move.src_row][move.dst_col] = move.piece_captured
-            
-            self.enpassant_possible_log.pop()
-            self.enpassant_possible = self.enpassant_possible_log[-1]
+                self.set_square(move.dst_row, move.dst_col, '--')
+                self.set_square(move.src_row, move.dst_col, piece_captured)
             
-            # undo castle rights
-            self.castle_rights_log.pop()
-            self.current_castle_right = self.castle_rights_log[-1]
+            self.castle_rights = (state >> 4) & 0xF
+            enpassant_file = (state >> 8) & 0xF
+            # the pawn that could be taken en passant was pushed by the side not to move
+            self.enpassant_possible = bitboard.SQUARES[(2 if self.white_to_move else 5) * 8 + enpassant_file - 1] if enpassant_file else ()
+            self.halfmove_clock = state >> 12
             # undo castle move
             if move.is_castle_move:
                 if move.dst_col - move.src_col==2:
-                    self.board[move.dst_row][move.dst_col+1] = self.board[move.dst_row][move.dst_col-1] 
-                    self.board[move.dst_row][move.dst_col-1] = '--'
+                    self.set_square(move.dst_row, move.dst_col+1, self.board[move.dst_row][move.dst_col-1])
+                    self.set_square(move.dst_row, move.dst_col-1, '--')
                     
                 else:
-                    self.board[move.dst_row][move.dst_col-2] = self.board[move.dst_row][move.dst_col+1] 
-                    self.board[move.dst_row][move.dst_col+1] = '--'
+                    self.set_square(move.dst_row, move.dst_col-2, self.board[move.dst_row][move.dst_col+1])
+                    self.set_square(move.dst_row, move.dst_col+1, '--')
+            self.zobrist_key = self.undo_keys[ply]
             
             self.in_check_mate = False
             self.in_stale_mate = False
+            if self.verify_zobrist:
+                self.check_zobrist_key()
+
+    def repetition_count(self):
+        """
+        How many times the current position has occurred, 3 is a draw by threefold repetition.
+        """
+        return self.key_counts.get(self.zobrist_key, 0)
+
+    def is_repetition(self, root_ply=0):
+        """
+        Draw by repetition for the search: the position occurred three times, or twice with the earlier one at or after
+        root_ply (a cycle inside the search tree). O(1) unless the position has been seen before.
+        """
+        count = self.key_counts.get(self.zobrist_key, 0)
+        if count < 2:
+            return False
+        if count >= 3:
+            return True
+        ply = len(self.move_log)
+        # same side to move only, and nothing before the last capture or pawn move can come back
+        for i in range(ply - 2, max(root_ply, ply - self.halfmove_clock) - 1, -2):
+            if self.undo_keys[i] == self.zobrist_key:
+                return True
+        return False
+
+    def get_key_history(self):
+        """
+        Keys of the earlier positions of the game, repeats included, for add_key_history on a copy loaded from a FEN.
+        """
+        history = []
+        for key, count in self.key_counts.items():
+            history.extend([key] * (count - (key == self.zobrist_key)))
+        return history
+
+    def add_key_history(self, keys):
+        """
+        Counts keys as positions played before the current one, a FEN alone doesn't carry them.
+        """
+        for key in keys:
+            self.key_counts[key] = self.key_counts.get(key, 0) + 1
+
+    def make_null_move(self):
+        """
+        Passes the turn without moving, for null move pruning. It isn't recorded in move_log, undo_null_move takes back
+        the state returned here and has to come after every move made on top of it has been undone.
+        """
+        state = (self.enpassant_possible, self.zobrist_key)
+        self.zobrist_key ^= zobrist.SIDE_KEY ^ zobrist.enpassant_key(self.enpassant_possible)
+        self.enpassant_possible = ()
+        self.white_to_move = not self.white_to_move
+        return state
+
+    def undo_null_move(self, state):
+        self.enpassant_possible, self.zobrist_key = state
+        self.white_to_move = not self.white_to_move
+
+    def check_zobrist_key(self):
+        expected = zobrist.compute_key(self)
+        assert self.zobrist_key == expected, "zobrist key drifted: %x != %x" % (self.zobrist_key, expected)
+
+    def load_fen(self, fen):
+        """
+        Replaces the whole position with the one described by fen, the move history starts out empty.
+        Every field is checked before anything changes, a bad FEN raises ValueError and leaves the position as it was.
+        """
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("FEN needs at least 4 fields: %r" % fen)
+        board = []
+        king_locations = {"w": [], "b": []}
+        for rank in fields[0].split("/"):
+            row = []
+            for char in rank:
+                if char.isdigit():
+                    row.extend(["--"] * int(char))
+                elif char.upper() in "PNBRQK":
+                    piece = ("w" if char.isupper() else "b") + char.upper()
+                    if piece[1] == "K":
+                        king_locations[piece[0]].append((len(board), len(row)))
+                    row.append(piece)
+                else:
+                    raise ValueError("Bad piece %r in FEN: %r" % (char, fen))
+            if len(row) != 8:
+                raise ValueError("Rank %r doesn't have 8 squares: %r" % (rank, fen))
+            board.append(row)
+        if len(board) != 8 or fields[1] not in ("w", "b"):
+            raise ValueError("Bad FEN: %r" % fen)
+        if len(king_locations["w"]) != 1 or len(king_locations["b"]) != 1:
+            raise ValueError("FEN needs exactly one king per side: %r" % fen)
+        if "wP" in board[0] + board[7] or "bP" in board[0] + board[7]:
+            raise ValueError("FEN has a pawn on the first or last rank: %r" % fen)
+        white_to_move = fields[1] == "w"
+        # the side that just moved can't have left its king in check
+        bitboards = {piece: 0 for piece in bitboard.PIECES}
+        occupied = 0
+        for r in range(8):
+            for c in range(8):
+                if board[r][c] != "--":
+                    bitboards[board[r][c]] |= bitboard.square_bit(r, c)
+                    occupied |= bitboard.square_bit(r, c)
+        waiting_king = king_locations["b" if white_to_move else "w"][0]
+        if bitboard.attackers_to(waiting_king[0] * 8 + waiting_king[1], fields[1], bitboards, occupied):
+            raise ValueError("FEN has the side not to move in check: %r" % fen)
+        castling = fields[2]
+        if castling != "-" and (not castling or any(char not in "KQkq" for char in castling)):
+            raise ValueError("Bad castling field %r in FEN: %r" % (castling, fen))
+        enpassant = fields[3]
+        if enpassant == "-":
+            enpassant_possible = ()
+        elif len(enpassant) == 2 and enpassant[0] in Move.files_to_cols and enpassant[1] == ("6" if white_to_move else "3"):
+            enpassant_possible = (Move.ranks_to_rows[enpassant[1]], Move.files_to_cols[enpassant[0]])
+        else:
+            raise ValueError("Bad en passant square %r in FEN: %r" % (enpassant, fen))
+        for clock in fields[4:6]:
+            if not clock.isdigit():
+                raise ValueError("Bad move clock %r in FEN: %r" % (clock, fen))
+        halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+
+        self.board = board
+        self.white_king_location = king_locations["w"][0]
+        self.black_king_location = king_locations["b"][0]
+        self.white_to_move = white_to_move
+        self.move_log = []
+        self.castle_rights = (
+            ("K" in castling) * WHITE_KING_SIDE
+            | ("k" in castling) * BLACK_KING_SIDE
+            | ("Q" in castling) * WHITE_QUEEN_SIDE
+            | ("q" in castling) * BLACK_QUEEN_SIDE
+        )
+        self.enpassant_possible = enpassant_possible
+        self.halfmove_clock = halfmove_clock
+        self.start_ply = max(fullmove_number - 1, 0) * 2 + (0 if white_to_move else 1)
+        self.in_check = self.in_check_mate = self.in_stale_mate = False
+        self.pin_directions = {}
+        self.checks = []
+        self.check_mask = bitboard.FULL
+        self.init_bitboards()
+        self.init_evaluation()
+        self.zobrist_key = zobrist.compute_key(self)
+        self.key_counts = {self.zobrist_key: 1}
+
+    def get_fen(self):
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for square in row:
+                if square == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += square[1] if square[0] == "w" else square[1].lower()
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        castling = ""
+        if self.castle_rights & WHITE_KING_SIDE:
+            castling += "K"
+        if self.castle_rights & WHITE_QUEEN_SIDE:
+            castling += "Q"
+        if self.castle_rights & BLACK_KING_SIDE:
+            castling += "k"
+        if self.castle_rights & BLACK_QUEEN_SIDE:
+            castling += "q"
+        enpassant = "-"
+        if self.enpassant_possible:
+            enpassant = Move.cols_to_files[self.enpassant_possible[1]] + Move.rows_to_ranks[self.enpassant_possible[0]]
+        return "%s %s %s %s %d %d" % ("/".join(ranks), "w" if self.white_to_move else "b", castling or "-", enpassant, self.halfmove_clock, self.get_fullmove_number())
+
+    def get_fullmove_number(self):
+        return (self.start_ply + len(self.move_log)) // 2 + 1
+
+    def load_epd(self, epd):
+        """
+        Loads an EPD line, the first four FEN fields followed by operations, and returns the operations as a dict.
+        The hmvc and fmvn operations set the move clocks when present.
+        """
+        fields = epd.split(None, 4)
+        if len(fields) < 4:
+            raise ValueError("EPD needs at least 4 fields: %r" % epd)
+        operations = parse_epd_operations(fields[4]) if len(fields) > 4 else {}
+        self.load_fen("%s %s %s" % (" ".join(fields[:4]), operations.get("hmvc", "0"), operations.get("fmvn", "1")))
+        return operations
+
+    def get_epd(self, operations=None):
+        """
+        The position as an EPD line, followed by operations ({opcode: operand}) when given.
+        """
+        epd = " ".join(self.get_fen().split()[:4])
+        for opcode, operand in (operations or {}).items():
+            operand = str(operand)
+            # id and the c0-c9 comments are string operands, anything with a space or ; has to be quoted too
+            if opcode == "id" or (opcode[0] == "c" and opcode[1:].isdigit()) or " " in operand or ";" in operand:
+                operand = '"%s"' % operand
+            epd += " %s %s;" % (opcode, operand) if operand else " %s;" % opcode
+        return epd
 
     def update_castle_rights(self,move):
-        if move.piece_moved=='wK':
-            self.current_castle_right.wks = False
-            self.current_castle_right.wqs = False
-            
-        elif move.piece_moved=='bK':
-            self.current_castle_right.bks = False
-            self.current_castle_right.bqs = False
-        
-        elif move.piece_moved=='wR':
-            if move.src_row==7:
-                if move.src_col==0:
-                    self.current_castle_right.wqs = False
-                elif move.src_col==7:
-                    self.current_castle_right.wks = False            
-        
-        elif move.piece_moved=='bR':
-            if move.src_row==0:
-                if move.src_col==0:
-                    self.current_castle_right.bqs = False
-                elif move.src_col==7:
-                    self.current_castle_right.bks = False
-        
-        # If rook is captured
-        if move.piece_captured == 'wR':
-            if move.dst_row == 7:
-                if move.dst_col == 0:
-                    self.current_castle_right.wqs = False
-                elif move.dst_col == 7:    
-                    self.current_castle_right.wks = False
-        
-        elif move.piece_captured == 'bR':
-            if move.dst_row == 0:
-                if move.dst_col == 0:
-                    self.current_castle_right.wqs = False
-                elif move.dst_col == 7:    
-                    self.current_castle_right.wks = False
+        # a king or rook leaving its square, or a rook captured on it, loses the rights tied to that square
+        self.castle_rights &= CASTLE_RIGHTS_KEPT[move.move_id & 0x3F] & CASTLE_RIGHTS_KEPT[(move.move_id >> 6) & 0x3F]
         
     def get_valid_moves(self):
-        temp_castle_rights = CastleRights(self.current_castle_right.wks,self.current_castle_right.bks,self.current_castle_right.wqs,self.current_castle_right.bqs)
-        
+        if self.use_bitboards:
+            moves = self.get_bitboard_moves()
+            self.update_game_over(moves)
+            return moves
+
         moves = []
-        self.in_check,self.pins,self.checks = self.check_for_pins_and_checks()
+        self.in_check,self.pin_directions,self.checks = self.check_for_pins_and_checks()
+        self.get_enemy_attacks()  # king moves and castling test their squares against this map
       
         if self.white_to_move:
             king_row = self.white_king_location[0]
@@ -182,54 +570,42 @@ class GameState:
             king_col = self.black_king_location[1]
         if self.in_check:
             if len(self.checks) == 1:  # only 1 check, block the check or move the king
+                # to block the check you must capture the checker or put a piece between it and your king,
+                # a knight can't be blocked and BETWEEN is empty for it
+                check_sq = self.checks[0][0] * 8 + self.checks[0][1]
+                self.check_mask = bitboard.BETWEEN[king_row * 8 + king_col][check_sq] | 1 << check_sq
                 moves = self.get_possible_moves()
-                # to block the check you must put a piece into one of the squares between the enemy piece and your king
-                check = self.checks[0]  # check information
-                check_row = check[0]
-                check_col = check[1]
-                piece_checking = self.board[check_row][check_col]
-                valid_squares = []  # squares that pieces can move to
-                # if knight, must capture the knight or move your king, other pieces can be blocked
-                if piece_checking[1] == "N":
-                    valid_squares = [(check_row, check_col)]
-                else:
-                    for i in range(1, 8):
-                        valid_square = (king_row + check[2] * i,
-                                        king_col + check[3] * i)  # check[2] and check[3] are the check directions
-                        valid_squares.append(valid_square)
-                        if valid_square[0] == check_row and valid_square[
-                            1] == check_col:  # once you get to piece and check
-                            break
-                # get rid of any moves that don't block check or move king
-                for i in range(len(moves) - 1, -1, -1):  # iterate through the list backwards when removing elements
-                    if moves[i].piece_moved[1] != "K":  # move doesn't move king so it must block or capture
-                        if not (moves[i].dst_row,
-                                moves[i].dst_col) in valid_squares:  # move doesn't block or capture piece
-                            moves.remove(moves[i])
             else:  # double check, king has to move
-                self.getKingMoves(king_row, king_col, moves)
+                self.check_mask = 0
+                self.get_king_moves(king_row, king_col, moves)
         else:  # not in check - all moves are fine
+            self.check_mask = bitboard.FULL
             moves = self.get_possible_moves()
             if self.white_to_move:
                 self.get_castle_moves(self.white_king_location[0], self.white_king_location[1], moves)
             else:
                 self.get_castle_moves(self.black_king_location[0], self.black_king_location[1], moves)
 
+        self.update_game_over(moves)
+        return moves
+
+    def update_game_over(self, moves):
         if len(moves) == 0:
-            if self.is_in_check():
-                self.checkmate = True
+            if self.in_check:
+                self.in_check_mate = True
             else:
-                # TODO stalemate on repeated moves
-                self.stalemate = True
+                # draws by repetition and the fifty move rule are left to repetition_count and halfmove_clock
+                self.in_stale_mate = True
         else:
-            self.checkmate = False
-            self.stalemate = False
-
-        self.current_castling_rights = temp_castle_rights
-        return moves
+            self.in_check_mate = False
+            self.in_stale_mate = False
 
     def check_for_pins_and_checks(self):
-        pins = []  # squares pinned and the direction its pinned from
+        """
+        One scan out from the king, returns in_check, the pin table {(row, col): direction} and the checks as
+        (row, col, direction row, direction col).
+        """
+        pins = {}  # squares pinned and the direction its pinned from
         checks = []  # squares where enemy is applying a check
         in_check = False
         if self.white_to_move:
@@ -284,7 +660,7 @@ class GameState:
                             or (4 <= j <= 7 and enemy_type == "B")
                             or (
                                 i == 1
-                                and enemy_type == "p"
+                                and enemy_type == "P"
                                 and (
                                     (enemy_color == "w" and 6 <= j <= 7)
                                     or (enemy_color == "b" and 4 <= j <= 5)
@@ -300,7 +676,7 @@ class GameState:
                                 )
                                 break
                             else:  # piece blocking so pin
-                                pins.append(possible_pin)
+                                pins[possible_pin[0], possible_pin[1]] = (possible_pin[2], possible_pin[3])
                                 break
                         else:  # enemy piece not applying checks
                             break
@@ -344,14 +720,9 @@ class GameState:
         return moves
 
     def get_pawn_moves(self, row, col, moves):
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+        pin_direction = self.pin_directions.get((row, col))
+        piece_pinned = pin_direction is not None
+        check_mask = self.check_mask
 
         if self.white_to_move:
             move_amount = -1
@@ -363,17 +734,21 @@ class GameState:
             start_row = 1
             enemy_color = "w"
             king_row, king_col = self.black_king_location
+        dst_sq = (row + move_amount) * 8 + col
 
         if self.board[row + move_amount][col] == "--":  # 1 square pawn advance
-            if not piece_pinned or pin_direction == (move_amount, 0):
-                moves.append(Move((row, col), (row + move_amount, col), self.board))
-                if row == start_row and self.board[row + 2 * move_amount][col] == "--":  # 2 square pawn advance
+            # a pawn pinned along its file still pushes, towards its king or away from it
+            if not piece_pinned or pin_direction in ((move_amount, 0), (-move_amount, 0)):
+                if (check_mask >> dst_sq) & 1:
+                    self.add_pawn_move((row, col), (row + move_amount, col), moves)
+                if row == start_row and self.board[row + 2 * move_amount][col] == "--" and (check_mask >> (dst_sq + 8 * move_amount)) & 1:  # 2 square pawn advance
                     moves.append(Move((row, col), (row + 2 * move_amount, col), self.board))
         if col - 1 >= 0:  # capture to the left
             if not piece_pinned or pin_direction == (move_amount, -1):
-                if self.board[row + move_amount][col - 1][0] == enemy_color:
-                    moves.append(Move((row, col), (row + move_amount, col - 1), self.board))
-                if (row + move_amount, col - 1) == self.enpassant_possible:
+                if self.board[row + move_amount][col - 1][0] == enemy_color and (check_mask >> (dst_sq - 1)) & 1:
+                    self.add_pawn_move((row, col), (row + move_amount, col - 1), moves)
+                # en passant also gets out of check by taking the checking pawn beside us
+                if (row + move_amount, col - 1) == self.enpassant_possible and (check_mask >> (dst_sq - 1) | check_mask >> (row * 8 + col - 1)) & 1:
                     attacking_piece = blocking_piece = False
                     if king_row == row:
                         if king_col < col:  # king is left of the pawn
@@ -391,15 +766,17 @@ class GameState:
                             square = self.board[row][i]
                             if square[0] == enemy_color and (square[1] == "R" or square[1] == "Q"):
                                 attacking_piece = True
+                                break
                             elif square != "--":
                                 blocking_piece = True
+                                break
                     if not attacking_piece or blocking_piece:
                         moves.append(Move((row, col), (row + move_amount, col - 1), self.board, is_enpassant_move=True))
         if col + 1 <= 7:  # capture to the right
             if not piece_pinned or pin_direction == (move_amount, +1):
-                if self.board[row + move_amount][col + 1][0] == enemy_color:
-                    moves.append(Move((row, col), (row + move_amount, col + 1), self.board))
-                if (row + move_amount, col + 1) == self.enpassant_possible:
+                if self.board[row + move_amount][col + 1][0] == enemy_color and (check_mask >> (dst_sq + 1)) & 1:
+                    self.add_pawn_move((row, col), (row + move_amount, col + 1), moves)
+                if (row + move_amount, col + 1) == self.enpassant_possible and (check_mask >> (dst_sq + 1) | check_mask >> (row * 8 + col + 1)) & 1:
                     attacking_piece = blocking_piece = False
                     if king_row == row:
                         if king_col < col:  # king is left of the pawn
@@ -417,23 +794,24 @@ class GameState:
                             square = self.board[row][i]
                             if square[0] == enemy_color and (square[1] == "R" or square[1] == "Q"):
                                 attacking_piece = True
+                                break
                             elif square != "--":
                                 blocking_piece = True
+                                break
                     if not attacking_piece or blocking_piece:
                         moves.append(Move((row, col), (row + move_amount, col + 1), self.board, is_enpassant_move=True))
      
+    def add_pawn_move(self, source, destination, moves):
+        if destination[0] == 0 or destination[0] == 7:
+            for promotion_piece in Move.promotion_pieces:
+                moves.append(Move(source, destination, self.board, promotion_piece=promotion_piece))
+        else:
+            moves.append(Move(source, destination, self.board))
+
     def get_rook_moves(self, r, c, moves):
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                if (
-                    self.board[r][c][1] != "Q"
-                ):  # Since we are also calculating Queen movements with this func
-                    self.pins.remove(self.pins[i])
-                break
+        pin_direction = self.pin_directions.get((r, c))
+        piece_pinned = pin_direction is not None
+        check_mask = self.check_mask
 
         directions = (
             (0, -1),  # Left
@@ -457,10 +835,12 @@ class GameState:
                         destination_piece = self.board[dst_row][dst_col]
 
                         if destination_piece == "--":  # Empty Cell
-                            moves.append(Move((r, c), (dst_row, dst_col), self.board))
+                            if (check_mask >> (dst_row * 8 + dst_col)) & 1:
+                                moves.append(Move((r, c), (dst_row, dst_col), self.board))
 
                         elif destination_piece[0] == enemy_color:  # Enemy Piece
-                            moves.append(Move((r, c), (dst_row, dst_col), self.board))
+                            if (check_mask >> (dst_row * 8 + dst_col)) & 1:
+                                moves.append(Move((r, c), (dst_row, dst_col), self.board))
                             break  # Cannot move further
 
                         else:  # Friendly Piece
@@ -469,14 +849,9 @@ class GameState:
                     break
 
     def get_knight_moves(self, r, c, moves):
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+        if (r, c) in self.pin_directions:
+            return  # a pinned knight can never stay on the pin line
+        check_mask = self.check_mask
         directions = (
             (-2, -1),
             (-2, 1),
@@ -492,20 +867,14 @@ class GameState:
             dst_row = r + d[0]
             dst_col = c + d[1]
             if 0 <= dst_row < len(self.board[0]) and 0 <= dst_col < len(self.board[0]):
-                if not piece_pinned:
-                    destination_piece = self.board[dst_row][dst_col]
-                    if destination_piece[0] != ally_color:  # Enemy Piece
-                        moves.append(Move((r, c), (dst_row, dst_col), self.board))
+                destination_piece = self.board[dst_row][dst_col]
+                if destination_piece[0] != ally_color and (check_mask >> (dst_row * 8 + dst_col)) & 1:  # Enemy Piece
+                    moves.append(Move((r, c), (dst_row, dst_col), self.board))
 
     def get_bishop_moves(self, r, c, moves):
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+        pin_direction = self.pin_directions.get((r, c))
+        piece_pinned = pin_direction is not None
+        check_mask = self.check_mask
 
         directions = (
             (-1, -1),  # up - left
@@ -529,10 +898,12 @@ class GameState:
                         destination_piece = self.board[dst_row][dst_col]
 
                         if destination_piece == "--":  # Empty Cell
-                            moves.append(Move((r, c), (dst_row, dst_col), self.board))
+                            if (check_mask >> (dst_row * 8 + dst_col)) & 1:
+                                moves.append(Move((r, c), (dst_row, dst_col), self.board))
 
                         elif destination_piece[0] == enemy_color:  # Enemy Piece
-                            moves.append(Move((r, c), (dst_row, dst_col), self.board))
+                            if (check_mask >> (dst_row * 8 + dst_col)) & 1:
+                                moves.append(Move((r, c), (dst_row, dst_col), self.board))
                             break  # Cannot move further
 
                         else:  # Friendly Piece
@@ -556,31 +927,23 @@ class GameState:
             (1, -1),  # down - left
         )
         ally_color = "w" if self.white_to_move else "b"
+        enemy_attacks = self.get_enemy_attacks()
         for d in directions:
             dst_row = r + d[0]
             dst_col = c + d[1]
             if 0 <= dst_row < len(self.board[0]) and 0 <= dst_col < len(self.board[0]):
                 destination_piece = self.board[dst_row][dst_col]
-                if destination_piece[0] != ally_color:
-                    if ally_color == "w":  # Empty Cell
-                        self.white_king_location = (dst_row, dst_col)
-                    else:
-                        self.black_king_location = (dst_row, dst_col)
-                    in_check, pins, checks = self.check_for_pins_and_checks()
-                    if not in_check:  # Enemy Piece
-                        moves.append(Move((r, c), (dst_row, dst_col), self.board))
-                    if ally_color == "w":
-                        self.white_king_location = (r, c)
-                    else:
-                        self.black_king_location = (r, c)
+                # empty or enemy square the opponent doesn't attack
+                if destination_piece[0] != ally_color and not (enemy_attacks >> (dst_row * 8 + dst_col)) & 1:
+                    moves.append(Move((r, c), (dst_row, dst_col), self.board))
                   
     def get_castle_moves(self,r,c,moves):
         if self.square_under_attack(r,c):
             return
-        if (self.white_to_move and self.current_castle_right.wks) or (not self.white_to_move and self.current_castle_right.bks):
+        if self.castle_rights & (WHITE_KING_SIDE if self.white_to_move else BLACK_KING_SIDE):
             self.get_king_side_castle_moves(r,c,moves)
         
-        if (self.white_to_move and self.current_castle_right.wqs) or (not self.white_to_move and self.current_castle_right.bqs):
+        if self.castle_rights & (WHITE_QUEEN_SIDE if self.white_to_move else BLACK_QUEEN_SIDE):
             self.get_queen_side_castle_moves(r,c,moves)
         
     def get_king_side_castle_moves(self,r,c,moves):
@@ -593,72 +956,313 @@ class GameState:
             if not self.square_under_attack(r,c-1) and not self.square_under_attack(r,c-2):
                 moves.append(Move((r,c),(r,c-2),self.board,is_castle_move=True))
              
-class CastleRights:
-    def __init__(self, wks, bks, wqs, bqs):
-        self.wks = wks
-        self.bks = bks
-        self.wqs = wqs
-        self.bqs = bqs
+    def get_capture_moves(self):
+        """
+        Legal captures and promotions only, used by the quiescence search. Doesn't touch the checkmate/stalemate flags.
+        """
+        if self.use_bitboards:
+            return self.get_bitboard_moves(captures_only=True)
+        in_check_mate, in_stale_mate = self.in_check_mate, self.in_stale_mate
+        moves = [move for move in self.get_valid_moves() if move.is_capture or move.can_promote_pawn]
+        self.in_check_mate, self.in_stale_mate = in_check_mate, in_stale_mate
+        return moves
+
+    def get_quiet_moves(self):
+        """
+        Legal moves that neither capture nor promote, castling included, the complement of get_capture_moves.
+        Doesn't touch the checkmate/stalemate flags.
+        """
+        if self.use_bitboards:
+            return self.get_bitboard_moves(quiets_only=True)
+        in_check_mate, in_stale_mate = self.in_check_mate, self.in_stale_mate
+        moves = [move for move in self.get_valid_moves() if not move.is_capture and not move.can_promote_pawn]
+        self.in_check_mate, self.in_stale_mate = in_check_mate, in_stale_mate
+        return moves
+
+    def is_legal_move(self, move):
+        """
+        Whether move, which may come from another position (a killer move), is legal here. Checked on its own from the
+        bitboards instead of generating every move, only castling and en passant are looked up in the full list.
+        """
+        board = self.board
+        piece = board[move.src_row][move.src_col]
+        ally_color, enemy_color = ("w", "b") if self.white_to_move else ("b", "w")
+        if piece != move.piece_moved or piece[0] != ally_color:
+            return False
+        if move.is_castle_move or move.is_enpassant_move:
+            for legal_move in self.get_bitboard_moves():
+                if legal_move == move:
+                    return legal_move.piece_captured == move.piece_captured and legal_move.is_enpassant_move == move.is_enpassant_move
+            return False
+        target = board[move.dst_row][move.dst_col]
+        if target != move.piece_captured or target[0] == ally_color:
+            return False
+        src, dst = move.src_sq, move.dst_sq
+        occupied = self.color_bitboards["w"] | self.color_bitboards["b"]
+        piece_type = piece[1]
+        if piece_type == "N":
+            reachable = bitboard.KNIGHT_ATTACKS[src]
+        elif piece_type == "K":
+            reachable = bitboard.KING_ATTACKS[src]
+        elif piece_type == "R":
+            reachable = bitboard.rook_attacks(src, occupied)
+        elif piece_type == "B":
+            reachable = bitboard.bishop_attacks(src, occupied)
+        elif piece_type == "Q":
+            reachable = bitboard.rook_attacks(src, occupied) | bitboard.bishop_attacks(src, occupied)
+        elif move.is_capture:
+            reachable = bitboard.PAWN_ATTACKS[ally_color][src]
+        else:
+            forward = -8 if self.white_to_move else 8
+            reachable = 1 << (src + forward) if 0 <= src + forward < 64 else 0
+            if src >> 3 == (6 if self.white_to_move else 1) and not (occupied >> (src + forward)) & 1:
+                reachable |= 1 << (src + 2 * forward)
+        if not (reachable >> dst) & 1:
+            return False
+        # the own king must not be attacked once the piece has moved, a captured piece no longer attacks anything
+        src_bit, dst_bit = 1 << src, 1 << dst
+        if piece_type == "K":
+            return not bitboard.attackers_to(dst, enemy_color, self.bitboards, occupied ^ src_bit) & ~dst_bit
+        king_sq = self.bitboards[ally_color + "K"].bit_length() - 1
+        return not bitboard.attackers_to(king_sq, enemy_color, self.bitboards, occupied ^ src_bit | dst_bit) & ~dst_bit
+
+    def get_legal_move(self, move_id):
+        """
+        The move packed as move_id (a hash move) if it is legal here, else None.
+        """
+        src, dst = move_id & 0x3F, (move_id >> 6) & 0x3F
+        src_row, src_col = bitboard.SQUARES[src]
+        dst_row, dst_col = bitboard.SQUARES[dst]
+        piece = self.board[src_row][src_col]
+        if piece == "--":
+            return None
+        if (piece[1] == "K" and abs(dst_col - src_col) == 2) or (piece[1] == "P" and src_col != dst_col and self.board[dst_row][dst_col] == "--"):
+            # castling or en passant, rare enough to take from the full list
+            for move in self.get_bitboard_moves():
+                if move.move_id == move_id:
+                    return move
+            return None
+        move = Move((src_row, src_col), (dst_row, dst_col), self.board, promotion_piece=Move.promotion_pieces[move_id >> 12])
+        return move if move.move_id == move_id and self.is_legal_move(move) else None
+
+    def get_bitboard_moves(self, captures_only=False, quiets_only=False):
+        """
+        Legal move generation straight from the piece bitboards, pins and checks are resolved with masks so no illegal move is built.
+        captures_only gives captures and promotions, quiets_only everything else.
+        """
+        bb = self.bitboards
+        if self.white_to_move:
+            ally_color, enemy_color = "w", "b"
+            forward, start_row, last_row = -8, 6, 0
+        else:
+            ally_color, enemy_color = "b", "w"
+            forward, start_row, last_row = 8, 1, 7
+        board = self.board
+        squares = bitboard.SQUARES
+        own = self.color_bitboards[ally_color]
+        enemy = self.color_bitboards[enemy_color]
+        occupied = own | enemy
+        destinations = enemy if captures_only else ~occupied if quiets_only else ~own
+        king_bit = bb[ally_color + "K"]
+        king_sq = king_bit.bit_length() - 1
+        enemy_queens = bb[enemy_color + "Q"]
+        enemy_rooks = bb[enemy_color + "R"] | enemy_queens
+        enemy_bishops = bb[enemy_color + "B"] | enemy_queens
+
+        checkers = bitboard.attackers_to(king_sq, enemy_color, bb, occupied)
+        self.in_check = checkers != 0
+        moves = []
+
+        # sliders see through the king so it can't step back along a checking line
+        without_king = occupied ^ king_bit
+        targets = bitboard.KING_ATTACKS[king_sq] & destinations
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            dst = bit.bit_length() - 1
+            if not bitboard.attackers_to(dst, enemy_color, bb, without_king):
+                moves.append(Move(squares[king_sq], squares[dst], board))
+        if checkers & (checkers - 1):  # double check, only the king can move
+            return moves
+
+        if checkers:
+            target_mask = checkers | bitboard.BETWEEN[king_sq][checkers.bit_length() - 1]
+        else:
+            target_mask = bitboard.FULL
+            if not captures_only:
+                self.get_bitboard_castle_moves(king_sq, occupied, moves)
+
+        pin_masks = {}
+        snipers = (bitboard.ROOK_RAYS[king_sq] & enemy_rooks) | (bitboard.BISHOP_RAYS[king_sq] & enemy_bishops)
+        while snipers:
+            bit = snipers & -snipers
+            snipers ^= bit
+            between = bitboard.BETWEEN[king_sq][bit.bit_length() - 1]
+            blockers = between & occupied
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pin_masks[blockers.bit_length() - 1] = between | bit
+
+        not_own = destinations & target_mask
+        knights = bb[ally_color + "N"]
+        while knights:
+            bit = knights & -knights
+            knights ^= bit
+            sq = bit.bit_length() - 1
+            if sq in pin_masks:  # a pinned knight can never move
+                continue
+            targets = bitboard.KNIGHT_ATTACKS[sq] & not_own
+            while targets:
+                dst_bit = targets & -targets
+                targets ^= dst_bit
+                moves.append(Move(squares[sq], squares[dst_bit.bit_length() - 1], board))
+        queens = bb[ally_color + "Q"]
+        for pieces, directions in ((bb[ally_color + "R"] | queens, bitboard.ROOK_DIRECTIONS), (bb[ally_color + "B"] | queens, bitboard.BISHOP_DIRECTIONS)):
+            while pieces:
+                bit = pieces & -pieces
+                pieces ^= bit
+                sq = bit.bit_length() - 1
+                targets = bitboard.slider_attacks(sq, occupied, directions) & not_own
+                if sq in pin_masks:
+                    targets &= pin_masks[sq]
+                while targets:
+                    dst_bit = targets & -targets
+                    targets ^= dst_bit
+                    moves.append(Move(squares[sq], squares[dst_bit.bit_length() - 1], board))
+
+        ep_sq = -1
+        if self.enpassant_possible:
+            ep_sq = self.enpassant_possible[0] * 8 + self.enpassant_possible[1]
+        pawn_attacks = bitboard.PAWN_ATTACKS[ally_color]
+        pawns = bb[ally_color + "P"]
+        while pawns:
+            bit = pawns & -pawns
+            pawns ^= bit
+            sq = bit.bit_length() - 1
+            allowed = target_mask
+            if sq in pin_masks:
+                allowed &= pin_masks[sq]
+            dst = sq + forward
+            if not (occupied >> dst) & 1 and (not captures_only or dst >> 3 == last_row) and (not quiets_only or dst >> 3 != last_row):
+                if (allowed >> dst) & 1:
+                    self.add_pawn_move(squares[sq], squares[dst], moves)
+                if sq >> 3 == start_row and not captures_only and not (occupied >> (dst + forward)) & 1 and (allowed >> (dst + forward)) & 1:
+                    moves.append(Move(squares[sq], squares[dst + forward], board))
+            if quiets_only:
+                continue
+            targets = pawn_attacks[sq] & enemy & allowed
+            while targets:
+                dst_bit = targets & -targets
+                targets ^= dst_bit
+                self.add_pawn_move(squares[sq], squares[dst_bit.bit_length() - 1], moves)
+            if ep_sq >= 0 and (pawn_attacks[sq] >> ep_sq) & 1:
+                captured_bit = 1 << (ep_sq - forward)
+                # rebuild the occupancy after the capture and make sure the king is not exposed
+                after = (occupied ^ bit ^ captured_bit) | (1 << ep_sq)
+                if bitboard.rook_attacks(king_sq, after) & enemy_rooks:
+                    continue
+                if bitboard.bishop_attacks(king_sq, after) & enemy_bishops:
+                    continue
+                if checkers & ~captured_bit & ~(enemy_rooks | enemy_bishops):
+                    continue  # a knight check is not resolved by en passant
+                moves.append(Move(squares[sq], squares[ep_sq], board, is_enpassant_move=True))
+        return moves
+
+    def get_bitboard_castle_moves(self, king_sq, occupied, moves):
+        if self.white_to_move:
+            king_side, queen_side = self.castle_rights & WHITE_KING_SIDE, self.castle_rights & WHITE_QUEEN_SIDE
+        else:
+            king_side, queen_side = self.castle_rights & BLACK_KING_SIDE, self.castle_rights & BLACK_QUEEN_SIDE
+        if not (king_side or queen_side):
+            return
+        r, c = bitboard.SQUARES[king_sq]
+        enemy_color = "b" if self.white_to_move else "w"
+        if king_side and not occupied & (0b11 << (king_sq + 1)):
+            if not bitboard.attackers_to(king_sq + 1, enemy_color, self.bitboards, occupied) and not bitboard.attackers_to(king_sq + 2, enemy_color, self.bitboards, occupied):
+                moves.append(Move((r, c), (r, c + 2), self.board, is_castle_move=True))
+        if queen_side and not occupied & (0b111 << (king_sq - 3)):
+            if not bitboard.attackers_to(king_sq - 1, enemy_color, self.bitboards, occupied) and not bitboard.attackers_to(king_sq - 2, enemy_color, self.bitboards, occupied):
+                moves.append(Move((r, c), (r, c - 2), self.board, is_castle_move=True))
 
 class Move:
+    """
+    A move with fixed attribute slots. move_id packs it into one int: source square | destination square << 6 |
+    promotion << 12, squares counted row * 8 + col, so two moves are equal exactly when their ids are.
+    """
+    __slots__ = (
+        "src_row", "src_col", "dst_row", "dst_col", "piece_moved", "piece_captured", "is_castle_move",
+        "is_enpassant_move", "is_capture", "can_promote_pawn", "promotion_piece", "move_id",
+    )
+
     ranks_to_rows = {"1": 7, "2": 6, "3": 5, "4": 4, "5": 3, "6": 2, "7": 1, "8": 0}
     rows_to_ranks = {v: k for k, v in ranks_to_rows.items()}
 
     files_to_cols = {"a": 0, "b": 1, "c": 2, "d": 3, "e": 4, "f": 5, "g": 6, "h": 7}
     cols_to_files = {v: k for k, v in files_to_cols.items()}
 
-    def __init__(self, source, destination, board,is_enpassant_move = False,is_castle_move = False):
-        self.src_row = source[0]
-        self.src_col = source[1]
-        self.dst_row = destination[0]
-        self.dst_col = destination[1]
-        self.piece_moved = board[self.src_row][self.src_col]
-        self.piece_captured = board[self.dst_row][self.dst_col]
+    # queen is 0 so a GUI click, which can't pick a piece, matches the queen promotion
+    promotion_pieces = ("Q", "R", "B", "N")
+    promotion_codes = {"Q": 0, "R": 1, "B": 2, "N": 3}
+
+    def __init__(self, source, destination, board,is_enpassant_move = False,is_castle_move = False,promotion_piece = "Q"):
+        self.src_row, self.src_col = src_row, src_col = source
+        self.dst_row, self.dst_col = dst_row, dst_col = destination
+        self.piece_moved = piece_moved = board[src_row][src_col]
+        piece_captured = board[dst_row][dst_col]
         self.is_castle_move = is_castle_move
-        self.move_id = (
-            self.src_row * 1000
-            + self.src_col * 100
-            + self.dst_row * 10
-            + self.dst_col
-        )
+        move_id = src_row * 8 + src_col | (dst_row * 8 + dst_col) << 6
         # Pawn Promotion
-        self.can_promote_pawn =  (self.piece_moved == "wP" and self.dst_row == 0) or (
-            self.piece_moved == "bP" and self.dst_row == 7
-        )
+        self.can_promote_pawn = piece_moved[1] == "P" and (dst_row == 0 or dst_row == 7)
+        if self.can_promote_pawn:
+            self.promotion_piece = promotion_piece
+            move_id |= self.promotion_codes[promotion_piece] << 12
+        else:
+            self.promotion_piece = None
+        self.move_id = move_id
         # enpassant 
         self.is_enpassant_move = is_enpassant_move
-        self.is_capture = self.piece_captured != "--"
-        if self.is_enpassant_move:
-            self.piece_captured = 'wP' if self.piece_moved =='bP' else 'bP'
+        if is_enpassant_move:
+            piece_captured = 'wP' if piece_moved =='bP' else 'bP'
+        self.piece_captured = piece_captured
+        self.is_capture = piece_captured != "--"
+
+    @property
+    def src_sq(self):
+        return self.move_id & 0x3F
+
+    @property
+    def dst_sq(self):
+        return (self.move_id >> 6) & 0x3F
 
-        
-        
-        
     def __eq__(self, other) -> bool:
         if isinstance(other, Move):
             return self.move_id == other.move_id
         else:
             return False
 
+    def __hash__(self):
+        return self.move_id
+
     def get_chess_notation(self):
-        return self.get_rank_file(
+        notation = self.get_rank_file(
             self.src_row, self.src_col
         ) + self.get_rank_file(self.dst_row, self.dst_col)
+        if self.can_promote_pawn:
+            notation += self.promotion_piece.lower()
+        return notation
 
     def get_rank_file(self, r, c):
         return self.cols_to_files[c] + self.rows_to_ranks[r]
     
     def __str__(self):
         if self.is_castle_move:
-            return "0-0" if self.end_col == 6 else "0-0-0"
+            return "0-0" if self.dst_col == 6 else "0-0-0"
 
         end_square = self.get_rank_file(self.dst_row, self.dst_col)
 
-        if self.piece_moved[1] == "p":
+        if self.piece_moved[1] == "P":
             if self.is_capture:
-                return self.cols_to_files[self.src_col] + "x" + end_square
-            else:
-                return end_square + "Q" if self.is_pawn_promotion else end_square
+                end_square = self.cols_to_files[self.src_col] + "x" + end_square
+            return end_square + "=" + self.promotion_piece if self.can_promote_pawn else end_square
 
         move_string = self.piece_moved[1]
         if self.is_capture:
@@ -1,9 +1,7 @@
-from concurrent.futures import thread
-import glob
 import pygame as p
 from chess_engine import *
-from game_ai import find_best_move,random_move
-from multiprocessing import Process,Queue
+from game_ai import random_move
+from engine_pool import EnginePool,find_notation_move
 """
 This is main driver file, responsible for handling user input and displaying current GameState object.
 """
@@ -15,6 +13,8 @@ MOVE_LOGS_HEIGHT = 270
 DIMENSION = 8
 SQ_SIZE = HEIGHT // DIMENSION
 MAX_FPS = 15
+PONDER = True  # search the expected reply while the human is thinking
+AI_TIME_LIMIT = None  # seconds per AI move, None searches to game_ai.DEPTH
 IMAGES = {}
 WHITE_COLOR  = (245, 235, 218)
 BLACK_COLOR  = (105, 79, 71)
@@ -95,8 +95,8 @@ def animate_move(game_state,screen,board,clock):
         p.draw.rect(screen,color,end_square)
         if move.piece_captured !='--':
             if move.is_enpassant_move:
-                enpassant_row = move.end_row + 1 if move.piece_captured[0] == 'b' else move.end_row - 1
-                end_square = p.Rect(move.end_col * SQ_SIZE, enpassant_row * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+                enpassant_row = move.dst_row + 1 if move.piece_captured[0] == 'b' else move.dst_row - 1
+                end_square = p.Rect(move.dst_col * SQ_SIZE, enpassant_row * SQ_SIZE, SQ_SIZE, SQ_SIZE)
             screen.blit(IMAGES[move.piece_captured], end_square)
         screen.blit(IMAGES[move.piece_moved],p.Rect(temp_c*SQ_SIZE,temp_r*SQ_SIZE,SQ_SIZE,SQ_SIZE))
         p.display.flip()
@@ -160,6 +160,34 @@ def draw_menu(screen):
     screen.blit(text_object,text_location)
 
 
+def draw_thinking(screen,text):
+    """
+    Shows what the engine is doing under the key help, e.g. the depth and nodes of the running search.
+    """
+    menu_rect = p.Rect(BOARD_WIDTH,0,MOVE_LOGS_WIDTH,HEIGHT-MOVE_LOGS_HEIGHT)
+    font = p.font.SysFont('Helvetica',20,True,False)
+    text_object = font.render(text,True,p.Color(BLACK_COLOR))
+    text_location = menu_rect.move(MOVE_LOGS_WIDTH/2 - text_object.get_width()/2,270)
+    screen.blit(text_object,text_location)
+
+
+def start_ponder(engine_pool, game_state, response):
+    """
+    Starts a ponder search on the position after the reply the last search expects (the second move of its pv).
+    Returns (request_id, expected reply) or (None, None) when there is nothing to ponder.
+    """
+    if not PONDER or response is None or response['info'] is None or len(response['info']['pv']) < 2:
+        return None, None
+    expected_reply = response['info']['pv'][1]
+    ponder_state = GameState(fen=game_state.get_fen())
+    ponder_state.add_key_history(game_state.get_key_history())
+    move = find_notation_move(ponder_state.get_valid_moves(), expected_reply)
+    if move is None:
+        return None, None
+    ponder_state.make_move(move)
+    return engine_pool.submit(ponder_state, ponder=True), expected_reply
+
+
 def main():
     p.init()
     screen = p.display.set_mode((BOARD_WIDTH+MOVE_LOGS_WIDTH, HEIGHT))
@@ -180,7 +208,10 @@ def main():
     player_two = True # Play as black
     
     ai_thinking = False
-    move_finder_process = None
+    engine_pool = EnginePool()
+    ai_request = None
+    ponder_id = None  # ponder search running on the position after ponder_move
+    ponder_move = None
     move_undone = False
     while running:
         human_turn = (game_state.white_to_move and player_one) or (not game_state.white_to_move and player_two)
@@ -209,6 +240,14 @@ def main():
                         for i in range(len(valid_moves)):
                             if move == valid_moves[i]:
                                 game_state.make_move(valid_moves[i])
+                                if ponder_id is not None:
+                                    if valid_moves[i].get_chess_notation() == ponder_move:
+                                        # ponder hit, the search already running on this position becomes the AI move
+                                        engine_pool.ponderhit(ponder_id,time_limit=AI_TIME_LIMIT)
+                                        ai_request = ponder_id
+                                    else:
+                                        engine_pool.cancel(ponder_id)
+                                    ponder_id = None
                                 sq_selected = ()
                                 player_clicks = []
                                 move_made = True
@@ -224,9 +263,10 @@ def main():
                     game_state.undo_move()
                     move_made = True 
                     animate = False
-                    if ai_thinking:
-                        move_finder_process.terminate()
+                    if ai_thinking or ponder_id is not None:
+                        engine_pool.cancel()
                         ai_thinking = False
+                        ai_request = ponder_id = None
                     move_undone = True
                 if e.key == p.K_r: # Reset Game
                     game_state = GameState()   
@@ -235,9 +275,10 @@ def main():
                     move_made = False
                     animate = False
                     game_over = False
-                    if ai_thinking:
-                        move_finder_process.terminate()
+                    if ai_thinking or ponder_id is not None:
+                        engine_pool.cancel()
                         ai_thinking = False
+                        ai_request = ponder_id = None
                     move_undone = True
                     
                 if e.key ==p.K_m:
@@ -249,9 +290,10 @@ def main():
                     game_over = False
                     player_one = True
                     player_two = True
-                    if ai_thinking:
-                        move_finder_process.terminate()
+                    if ai_thinking or ponder_id is not None:
+                        engine_pool.cancel()
                         ai_thinking = False
+                        ai_request = ponder_id = None
                     move_undone = True
                     
                     
@@ -267,30 +309,32 @@ def main():
                     if not player_one and not player_two:
                         player_one = True
                         
-                    if ai_thinking:
-                        move_finder_process.terminate()
+                    if ai_thinking or ponder_id is not None:
+                        engine_pool.cancel()
                         ai_thinking = False
+                        ai_request = ponder_id = None
                     move_undone = True
                     
                 
-        # AI Move  
+        # AI Move, the search runs in the engine worker and is polled once a frame so the window stays responsive
         if not game_over and not human_turn and not move_undone:
             if not ai_thinking:
                 ai_thinking = True
-                thread_storage = Queue()
-                move_finder_process = Process(target=find_best_move,args=(game_state,valid_moves,thread_storage))
-                move_finder_process.start()
-                ai_move = thread_storage.get()
+                if ai_request is None:
+                    ai_request = engine_pool.submit(game_state,time_limit=AI_TIME_LIMIT)
+            response = engine_pool.poll()
+            if response is not None and response['id'] == ai_request:
+                ai_request = None
+                ai_move = find_notation_move(valid_moves,response['move'])
                 print(ai_move)
-                
-                               
-            if move_finder_process.is_alive:
                 if ai_move is None:
                     ai_move = random_move(valid_moves)
                 game_state.make_move(ai_move)
                 move_made = True
                 animate = True
                 ai_thinking = False
+                if (game_state.white_to_move and player_one) or (not game_state.white_to_move and player_two):
+                    ponder_id, ponder_move = start_ponder(engine_pool, game_state, response)
             
             
         if move_made:
@@ -302,6 +346,11 @@ def main():
             move_undone = False
             
         draw_game_state(screen, game_state, valid_moves, sq_selected, move_log_font, game_state.white_to_move)
+        if ai_thinking:
+            depth,searched_nodes = engine_pool.progress(ai_request)
+            draw_thinking(screen,"Thinking... depth %d, %d nodes" % (depth,searched_nodes))
+        elif ponder_id is not None:
+            draw_thinking(screen,"Pondering on " + ponder_move)
         
         if game_state.in_check_mate:
             game_over = True
@@ -312,10 +361,17 @@ def main():
         elif game_state.in_stale_mate:
             game_over = True
             draw_text(screen,'Stalemate')
+        elif game_state.repetition_count() >= 3:
+            game_over = True
+            draw_text(screen,'Draw by repetition')
+        elif game_state.halfmove_clock >= 100:
+            game_over = True
+            draw_text(screen,'Draw by the fifty move rule')
         
         
         clock.tick(MAX_FPS)
         p.display.flip()
+    engine_pool.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,76 @@
+"""
+Display free engine API for scripts and batch workers: set up a position, search it and get the move and the search
+stats back. Only the engine modules are imported from here, never pygame or the piece images.
+
+    game_state = new_game()
+    play_move(game_state, "e2e4")
+    result = search(game_state, time_limit=1.0)
+    result["notation"], result["score"], result["pv"]
+"""
+import game_ai
+from chess_engine import GameState
+
+
+def new_game(fen=None, use_bitboards=True):
+    """
+    A GameState at the start position, or at fen when given.
+    """
+    return GameState(use_bitboards=use_bitboards, fen=fen)
+
+
+def find_legal_move(game_state, notation):
+    """
+    The legal move written as notation (e2e4, e7e8n) in game_state, or None.
+    """
+    for move in game_state.get_valid_moves():
+        if move.get_chess_notation() == notation:
+            return move
+    return None
+
+
+def play_move(game_state, notation):
+    """
+    Makes the move written as notation, raises ValueError when it isn't legal here.
+    """
+    move = find_legal_move(game_state, notation)
+    if move is None:
+        raise ValueError("Illegal move %r in %s" % (notation, game_state.get_fen()))
+    game_state.make_move(move)
+    return move
+
+
+def search(game_state, time_limit=None, node_limit=None, depth=None, on_iteration=None, use_book=False):
+    """
+    Searches game_state and returns {move, notation, score, depth, nodes, time, pv, iterations}.
+    With no budget the search goes to depth (game_ai.DEPTH by default), with a time_limit in seconds or a node_limit it
+    deepens until the budget runs out, stopping at depth if that is given too. Score is in centipawns from the point of
+    view of the side to move. The root moves are not shuffled, so the same position gives the same answer.
+    use_book plays a weighted random move from game_ai's opening book instead when the position is in it, at depth 0.
+    """
+    valid_moves = game_state.get_valid_moves()
+    result = {"move": None, "notation": None, "score": 0, "depth": 0, "nodes": 0, "time": 0.0, "pv": [], "iterations": []}
+    if len(valid_moves) == 0:
+        turn_multiplier = 1 if game_state.white_to_move else -1
+        result["score"] = turn_multiplier * game_ai.score_board(game_state)
+        return result
+    move = game_ai.get_book_move(game_state, valid_moves) if use_book else None
+    if move is not None:
+        result.update(game_ai.search_info[-1])
+        result["iterations"] = list(game_ai.search_info)
+        result["move"] = move
+        result["notation"] = move.get_chess_notation()
+        return result
+    if depth is None and time_limit is None and node_limit is None:
+        depth = game_ai.DEPTH
+    game_ai.get_transposition_table().new_search()
+    game_ai.move_orderer.new_search()
+    move = game_ai.iterative_deepening(game_state, valid_moves, time_limit, node_limit, on_iteration, max_depth=depth)
+    result["iterations"] = list(game_ai.search_info)
+    if game_ai.search_info:
+        result.update(game_ai.search_info[-1])
+    if move is None:
+        # not even depth 1 fitted in the budget, any legal move beats none
+        move = valid_moves[0]
+    result["move"] = move
+    result["notation"] = move.get_chess_notation()
+    return result
@@ -0,0 +1,176 @@
+"""
+Long lived engine worker processes for the GUI and batch tools.
+Positions travel to the workers as FEN strings with the keys of the earlier positions for repetition draws, searches are answered over a response queue and a running search is
+cancelled through a shared counter, so a worker never has to be terminated.
+A ponder search runs on the opponent's time with no limit of its own until it is cancelled (a ponder miss) or given a
+budget by ponderhit, in which case it carries on from where it is with everything it already searched.
+The depth and node count of the running search are published through shared values for a live thinking display.
+"""
+import queue
+import time
+from multiprocessing import Process, Queue, Value
+
+import game_ai
+from chess_engine import GameState
+
+
+def worker_loop(requests, responses, cancelled_through, ponder_hit=None, search_progress=None):
+    """
+    Worker entry point. Requests are ("search", request_id, fen, key_history, time_limit, node_limit, ponder) or
+    ("quit",), every search request gets exactly one response dict back: {id, move, cancelled, info}.
+    ponder_hit holds the shared (request_id, deadline, depth) a ponder search switches to on a ponderhit,
+    search_progress the shared (request_id, depth, nodes) of the running search.
+    """
+    game_state = GameState()
+    current_id = [0]
+    pondering = [False]
+
+    def should_stop():
+        # polled every 256 nodes, which makes it the place to publish the progress
+        if search_progress is not None:
+            search_progress[1].value = game_ai.search_depth
+            search_progress[2].value = game_ai.nodes
+        # every request with an id up to cancelled_through is cancelled
+        if cancelled_through.value >= current_id[0]:
+            return True
+        if not pondering[0] or ponder_hit[0].value != current_id[0]:
+            return False
+        # deadline is in time.time() seconds, the one clock both processes agree on
+        return time.time() >= ponder_hit[1].value or 0 < ponder_hit[2].value < game_ai.search_depth
+
+    game_ai.stop_condition = should_stop
+    while True:
+        request = requests.get()
+        if request[0] == "quit":
+            break
+        _, request_id, fen, key_history, time_limit, node_limit, ponder = request
+        response = {"id": request_id, "move": None, "cancelled": True, "info": None}
+        if cancelled_through.value < request_id:
+            current_id[0] = request_id
+            pondering[0] = ponder and ponder_hit is not None
+            if search_progress is not None:
+                search_progress[1].value = search_progress[2].value = 0
+                search_progress[0].value = request_id
+            game_state.load_fen(fen)
+            game_state.add_key_history(key_history)
+            valid_moves = game_state.get_valid_moves()
+            if len(valid_moves) > 0:
+                result = queue.SimpleQueue()
+                game_ai.find_best_move(
+                    game_state, valid_moves, result, time_limit=time_limit, node_limit=node_limit,
+                    max_depth=game_ai.MAX_DEPTH if pondering[0] else None
+                )
+                move = result.get()
+                response["move"] = move.get_chess_notation() if move is not None else None
+                response["info"] = game_ai.search_info[-1] if game_ai.search_info else None
+            response["cancelled"] = cancelled_through.value >= request_id
+        responses.put(response)
+
+
+def find_notation_move(valid_moves, notation):
+    for move in valid_moves:
+        if move.get_chess_notation() == notation:
+            return move
+    return None
+
+
+class EnginePool:
+    def __init__(self, processes=1):
+        self.requests = Queue()
+        self.responses = Queue()
+        self.cancelled_through = Value("i", 0)
+        self.ponder_hit = (Value("i", 0), Value("d", 0.0), Value("i", 0))
+        # only ever written by the worker running the search, so no locks
+        self.search_progress = (Value("i", 0, lock=False), Value("i", 0, lock=False), Value("q", 0, lock=False))
+        self.next_id = 0
+        self.pending = set()
+        self.workers = []
+        for _ in range(processes):
+            worker = Process(
+                target=worker_loop, daemon=True,
+                args=(self.requests, self.responses, self.cancelled_through, self.ponder_hit, self.search_progress),
+            )
+            worker.start()
+            self.workers.append(worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, game_state, time_limit=None, node_limit=None, ponder=False):
+        """
+        Queues a search of game_state and returns its request id, the answer is collected with poll or get.
+        With ponder the search keeps deepening until it is cancelled or ponderhit gives it a budget.
+        """
+        self.next_id += 1
+        self.requests.put(
+            ("search", self.next_id, game_state.get_fen(), game_state.get_key_history(), time_limit, node_limit, ponder)
+        )
+        self.pending.add(self.next_id)
+        return self.next_id
+
+    def ponderhit(self, request_id, time_limit=None, max_depth=None):
+        """
+        The position a ponder search was started on came up: it now stops time_limit seconds from here or once max_depth
+        is complete (game_ai.DEPTH when neither is given), keeping the iterations it has already finished.
+        """
+        if time_limit is None and max_depth is None:
+            max_depth = game_ai.DEPTH
+        hit_id, deadline, depth = self.ponder_hit
+        with hit_id.get_lock():
+            deadline.value = time.time() + time_limit if time_limit is not None else float("inf")
+            depth.value = max_depth or 0
+            hit_id.value = request_id
+
+    def cancel(self, request_id=None):
+        """
+        Cancels request_id and every request before it, all outstanding requests by default.
+        Cancelled searches stop at their next budget check and their responses are dropped.
+        """
+        if request_id is None:
+            request_id = self.next_id
+        with self.cancelled_through.get_lock():
+            if request_id > self.cancelled_through.value:
+                self.cancelled_through.value = request_id
+
+    def progress(self, request_id):
+        """
+        (depth, nodes) of request_id while it is being searched, (0, 0) before it has started.
+        The depth is that of the iteration in progress and both are refreshed every 256 nodes.
+        """
+        searched_id, depth, nodes = self.search_progress
+        if searched_id.value != request_id:
+            return 0, 0
+        return depth.value, nodes.value
+
+    def busy(self):
+        return len(self.pending) > 0
+
+    def poll(self):
+        """
+        Returns the next live response without blocking, or None when there isn't one yet.
+        """
+        return self.get(block=False)
+
+    def get(self, block=True, timeout=None):
+        while True:
+            if block and not self.pending:
+                return None  # nothing left that could answer
+            try:
+                response = self.responses.get(block, timeout)
+            except queue.Empty:
+                return None
+            self.pending.discard(response["id"])
+            if response["cancelled"] or response["id"] <= self.cancelled_through.value:
+                continue
+            return response
+
+    def close(self):
+        self.cancel()
+        for _ in self.workers:
+            self.requests.put(("quit",))
+        for worker in self.workers:
+            worker.join(timeout=5)
+        self.workers = []
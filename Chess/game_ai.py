@@ -1,63 +1,321 @@
+import math
+import os
 import random
-import re
-from shutil import move
+import time
+import bitbases
 from chess_engine import GameState
-from multiprocessing import Queue
+from opening_book import OpeningBook
+from transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND, encode_move, find_move
+from move_ordering import MoveOrderer
+from piece_square_tables import PIECE_VALUES
 
-piece_scores={'K': 0,'P': 1,'R': 5,'N': 3,'B': 3,'Q': 10}
-CHECKMATE = 1000
+piece_scores={'K': 0,'P': 1,'R': 5,'N': 3,'B': 3,'Q': 10}  # pawn units, used to rank captures
+CHECKMATE = 100000  # scores are in centipawns, being mated ply moves from the root scores -CHECKMATE+ply
+MATE_THRESHOLD = CHECKMATE-1000  # any score at least this far from 0 is a mate
 STALEMATE = 0
+DRAW = 0  # repetition or fifty moves without a capture or pawn move
 DEPTH = 2
+MAX_DEPTH = 64  # iterative deepening ceiling when searching on a time or node budget
+QUIESCENCE = True  # resolve captures at depth 0 instead of scoring the board mid exchange
+QUIESCENCE_CHECKS = False  # also try quiet checking moves on the first quiescence ply
+MAX_QUIESCENCE_DEPTH = 8
+DELTA_MARGIN = 200  # a capture has to be able to lift the score to alpha within this margin to be searched
+STAGED_MOVES = True  # generate moves below the root lazily, stage by stage, instead of the full list up front
+PVS = True  # principal variation search, moves after the first get a zero window search and a re-search if it fails high
+ASPIRATION = True  # start every iteration after the first in a window around the last score
+ASPIRATION_WINDOW = 50  # centipawns either side, the side the score falls out of is widened fourfold
+NULL_MOVE = True  # pass the turn, a position still at or above beta after that is cut without searching it
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 3
+LMR = True  # late move reductions, late quiet moves are first searched to less depth
+LMR_MIN_DEPTH = 3
+LMR_FULL_MOVES = 3  # moves searched to full depth before the reductions start
+TT_SIZE_MB = 16
+transposition_table = None
+USE_BOOK = True  # find_best_move plays from the opening book at BOOK_PATH when the file exists, see book_builder.py
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")
+opening_book = None
+USE_BITBASES = True  # score KQK, KRK and KPK from the bitbases in bitbases.BITBASE_DIR, see bitbase_generator.py
+BITBASE_WIN = CHECKMATE//2  # a bitbase win, above any evaluation and below every mate
+move_orderer = MoveOrderer(piece_scores)
+search_depth = DEPTH  # depth of the current iteration, the root is where depth == search_depth
+search_root_ply = 0  # len(move_log) at the root, a position repeated from there on is a draw
+search_root_bitbase = False  # the root is covered by a bitbase, wins are searched on instead of cut
+search_info = []  # one report per completed iteration of the last search
+nodes = 0
+deadline = None
+max_nodes = None
+stop_condition = None  # optional callable, the running search is abandoned as soon as it returns True
 
 
+class SearchTimeout(Exception):
+    pass
+
+
+def build_lmr_reductions():
+    # grows with the log of both the remaining depth and the move index, reductions[depth][move_index]
+    return [[max(1,int(0.75+math.log(depth)*math.log(move_index+1)/2.25)) if depth and move_index else 0 for move_index in range(64)] for depth in range(64)]
+
+LMR_REDUCTIONS = build_lmr_reductions()
+
+
+# GameState keeps the material and piece-square totals up to date in make_move, nothing here scans the board
 def score_material(game_state:GameState):
-    score = 0
-    for row in game_state.board:
-        for square in row:
-            if square[0]=='w':
-                score+=piece_scores[square[1]]
-            else:
-                score-=piece_scores[square[1]]
-    return score
+    return game_state.material['w']-game_state.material['b']
 
-def score_board(game_state:GameState):
+def evaluate(game_state:GameState):
+    return game_state.material['w']-game_state.material['b']+game_state.piece_square_score['w']-game_state.piece_square_score['b']
+
+def score_board(game_state:GameState,ply = 0):
     if game_state.in_check_mate:
         if game_state.white_to_move:
-            return -CHECKMATE
+            return -CHECKMATE+ply
         else:
-            return CHECKMATE
+            return CHECKMATE-ply
     elif game_state.in_stale_mate:
         return STALEMATE
     
-    score = 0
-    for row in game_state.board:
-        for square in row:
-            if square[0]=='w':
-                score+=piece_scores[square[1]]
-            elif square[0]=='b':
-                score-=piece_scores[square[1]]
+    return evaluate(game_state)
+
+def mop_up(game_state:GameState):
+    # a bare king belongs on the edge with the other king close by, the search can't see the mate from far enough
+    white_strong = game_state.material['w']>game_state.material['b']
+    strong_king = game_state.bitboards['wK' if white_strong else 'bK'].bit_length()-1
+    weak_king = game_state.bitboards['bK' if white_strong else 'wK'].bit_length()-1
+    weak_row,weak_col = divmod(weak_king,8)
+    strong_row,strong_col = divmod(strong_king,8)
+    edge = max(3-weak_row,weak_row-4)+max(3-weak_col,weak_col-4)
+    distance = abs(strong_row-weak_row)+abs(strong_col-weak_col)
+    return 10*edge+4*(14-distance)
+
+def bitbase_score(game_state:GameState,turn_multiplier,ply):
+    """
+    The score for the side to move from the endgame bitbases, or None when they don't cover game_state.
+    Wins add the material and mop_up to BITBASE_WIN, the piece-square tables would keep the king away from the mate.
+    """
+    result = bitbases.probe(game_state)
+    if result is None:
+        return None
+    if result==bitbases.DRAW:
+        return DRAW
+    if result==bitbases.LOSS and game_state.is_in_check() and not game_state.get_valid_moves():
+        return -CHECKMATE+ply
+    return result*(BITBASE_WIN+mop_up(game_state))+turn_multiplier*score_material(game_state)
+
+def mate_distance(score):
+    """
+    Plies to the mate for a mate score, None for any other score.
+    """
+    if abs(score)<MATE_THRESHOLD:
+        return None
+    return CHECKMATE-abs(score)
+
+def score_to_table(score,ply):
+    # the table is shared by nodes at every ply, so mates are stored as the distance from the node itself
+    if score>=MATE_THRESHOLD:
+        return score+ply
+    if score<=-MATE_THRESHOLD:
+        return score-ply
+    return score
+
+def score_from_table(score,ply):
+    if score>=MATE_THRESHOLD:
+        return score-ply
+    if score<=-MATE_THRESHOLD:
+        return score+ply
     return score
 
 def random_move(valid_moves):
     return valid_moves[random.randint(0,len(valid_moves)-1)]
 
+def get_transposition_table():
+    global transposition_table
+    if transposition_table is None or transposition_table.size_mb != TT_SIZE_MB:
+        transposition_table = TranspositionTable(TT_SIZE_MB)
+    return transposition_table
+
+def get_opening_book():
+    """
+    The OpeningBook at BOOK_PATH, opened on first use, or None when there is no book file.
+    """
+    global opening_book
+    if opening_book is not None and opening_book.path != BOOK_PATH:
+        opening_book.close()
+        opening_book = None
+    if opening_book is None and BOOK_PATH and os.path.exists(BOOK_PATH):
+        opening_book = OpeningBook(BOOK_PATH)
+    return opening_book
+
+def get_book_move(game_state:GameState,valid_moves):
+    """
+    A weighted random book move for game_state, or None. search_info is set to a single depth 0 report for it.
+    """
+    global search_info
+    book = get_opening_book()
+    move = book.choose_move(game_state,valid_moves) if book is not None else None
+    if move is not None:
+        notation = move.get_chess_notation()
+        search_info = [{'depth': 0,'move': notation,'score': 0,'nodes': 0,'time': 0.0,'pv': [notation]}]
+    return move
+
 # main move function
-def find_best_move(game_state:GameState,valid_moves,thread_storage,nega_max = True):
+def find_best_move(game_state:GameState,valid_moves,thread_storage,nega_max = True,time_limit = None,node_limit = None,on_iteration = None,max_depth = None):
+    """
+    time_limit is in seconds and node_limit counts searched nodes, either one switches the search from a fixed DEPTH to
+    iterative deepening that stops when the budget runs out. max_depth caps the iterations, e.g. MAX_DEPTH for a
+    search that only ends through stop_condition.
+    """
     global next_move
     next_move = None
+    if USE_BOOK:
+        next_move = get_book_move(game_state,valid_moves)
+        if next_move is not None:
+            thread_storage.put(next_move)
+            return
+    get_transposition_table().new_search()
+    move_orderer.new_search()
+    # shuffled so the stable ordering breaks ties differently every game
     random.shuffle(valid_moves)
     if not nega_max:
         find_move_min_max(game_state,valid_moves,DEPTH, game_state.white_to_move)
     else:
-        find_move_nega_max_alpha_beta(game_state,valid_moves,DEPTH,-CHECKMATE,CHECKMATE, 1 if game_state.white_to_move else -1)
+        iterative_deepening(game_state,valid_moves,time_limit,node_limit,on_iteration,max_depth)
     
     thread_storage.put(next_move)
 
+def iterative_deepening(game_state:GameState,valid_moves,time_limit = None,node_limit = None,on_iteration = None,max_depth = None,root_share = False):
+    """
+    Searches depth 1, 2, 3... and returns the best move of the last completed iteration.
+    Every completed iteration appends {depth, move, score, nodes, time, pv} to search_info and is passed to on_iteration.
+    root_share means valid_moves is only part of the root moves (parallel_search), so a single move or a lost
+    position doesn't end the search early, the other shares still need this one's deeper results.
+    """
+    global next_move,search_depth,search_info,nodes,deadline,max_nodes,search_root_ply,search_root_bitbase
+    if max_depth is None:
+        max_depth = DEPTH if time_limit is None and node_limit is None else MAX_DEPTH
+    get_transposition_table()
+    start = time.perf_counter()
+    deadline = start + time_limit if time_limit is not None else None
+    max_nodes = node_limit
+    nodes = 0
+    search_info = []
+    best_move = None
+    root_ply = search_root_ply = len(game_state.move_log)
+    search_root_bitbase = USE_BITBASES and bitbases.probe(game_state) is not None
+    turn_multiplier = 1 if game_state.white_to_move else -1
+    score = 0
+    for depth in range(1,max_depth+1):
+        search_depth = depth
+        next_move = None
+        try:
+            if ASPIRATION and depth>1:
+                score = aspiration_search(game_state,valid_moves,depth,score,turn_multiplier)
+            else:
+                score = find_move_nega_max_alpha_beta(game_state,valid_moves,depth,-CHECKMATE,CHECKMATE,turn_multiplier)
+        except SearchTimeout:
+            # unwind the moves the aborted iteration left on the board
+            while len(game_state.move_log) > root_ply:
+                game_state.undo_move()
+            break
+        best_move = next_move
+        elapsed = time.perf_counter() - start
+        info = {
+            'depth': depth,
+            'move': best_move.get_chess_notation() if best_move is not None else None,
+            'score': score,
+            'nodes': nodes,
+            'time': elapsed,
+            'pv': [move.get_chess_notation() for move in get_principal_variation(game_state,depth)],
+        }
+        search_info.append(info)
+        if on_iteration is not None:
+            on_iteration(info)
+        # a mate is only settled once this iteration reached it, a longer one came from the table and may not hold
+        plies = mate_distance(score)
+        if plies is not None and plies<=depth and (score>0 or not root_share):
+            break
+        if not root_share and len(valid_moves)<=1:
+            break
+        # the next iteration costs more than all previous ones together, don't start what can't finish
+        if time_limit is not None and elapsed>time_limit/2:
+            break
+    next_move = best_move
+    return best_move
+
+def aspiration_search(game_state:GameState,valid_moves,depth,previous_score,turn_multiplier):
+    """
+    Root search in a window around the previous iteration's score. A score outside it is only a bound, so the window is
+    widened on that side and the root searched again until the score lands inside.
+    """
+    global next_move
+    window = ASPIRATION_WINDOW
+    alpha,beta = max(previous_score-window,-CHECKMATE),min(previous_score+window,CHECKMATE)
+    while True:
+        score = find_move_nega_max_alpha_beta(game_state,valid_moves,depth,alpha,beta,turn_multiplier)
+        if score<=alpha and alpha>-CHECKMATE:
+            window *= 4
+            alpha = max(previous_score-window,-CHECKMATE)
+        elif score>=beta and beta<CHECKMATE:
+            window *= 4
+            beta = min(previous_score+window,CHECKMATE)
+        else:
+            return score
+        next_move = None
+
+def has_non_pawn_material(game_state:GameState):
+    # with only king and pawns passing can be the best move, null move pruning would miss the zugzwang
+    color = 'w' if game_state.white_to_move else 'b'
+    bitboards = game_state.bitboards
+    return bitboards[color+'N'] | bitboards[color+'B'] | bitboards[color+'R'] | bitboards[color+'Q'] != 0
+
+def null_move_search(game_state:GameState,depth,beta,turn_multiplier,ply):
+    """
+    Score of passing the turn, searched to depth-1-NULL_MOVE_REDUCTION with a zero window at beta.
+    """
+    moves_made = len(game_state.move_log)
+    state = game_state.make_null_move()
+    try:
+        opponent_moves = None if STAGED_MOVES else game_state.get_valid_moves()
+        score = -find_move_nega_max_alpha_beta(game_state,opponent_moves,depth-1-NULL_MOVE_REDUCTION,-beta,-beta+1,-turn_multiplier,ply+1,False)
+    except SearchTimeout:
+        # the null move sits under the moves the aborted search left on the board, those come off first
+        while len(game_state.move_log)>moves_made:
+            game_state.undo_move()
+        game_state.undo_null_move(state)
+        raise
+    game_state.undo_null_move(state)
+    return score
+
+def check_budget():
+    if (deadline is not None and time.perf_counter()>=deadline) or (max_nodes is not None and nodes>=max_nodes):
+        raise SearchTimeout()
+    if stop_condition is not None and stop_condition():
+        raise SearchTimeout()
+
+def get_principal_variation(game_state:GameState,depth):
+    """
+    Follows the best moves stored in the transposition table from the current position.
+    """
+    table = get_transposition_table()
+    pv = []
+    for _ in range(depth):
+        entry = table.probe(game_state.zobrist_key)
+        if entry is None:
+            break
+        move = find_move(game_state.get_valid_moves(),entry[3])
+        if move is None:
+            break
+        pv.append(move)
+        game_state.make_move(move)
+    for _ in pv:
+        game_state.undo_move()
+    return pv
+
 # Min Max
 def find_move_min_max(game_state:GameState,valid_moves,depth,white_to_move):
     global next_move
     if depth==0:
-        return score_material(game_state.board)    
+        return score_material(game_state)    
     
     if white_to_move:
         max_score = -CHECKMATE
@@ -106,21 +364,100 @@ def find_move_nega_max(game_state:GameState,valid_moves,depth,turn_multiplier):
     return max_score
 
 # Alpha beta pruning
-def find_move_nega_max_alpha_beta(game_state:GameState,valid_moves,depth,alpha,beta,turn_multiplier):
-    global next_move
+def find_move_nega_max_alpha_beta(game_state:GameState,valid_moves,depth,alpha,beta,turn_multiplier,ply = 0,null_allowed = True):
+    """
+    valid_moves is the full move list, or None to take the moves from move_orderer.staged_moves as they are needed.
+    ply counts the moves from the root, null_allowed is False right after a null move so two never follow each other.
+    """
+    global next_move,nodes
+    nodes += 1
+    if ply==0:
+        get_transposition_table()  # built here so a bare call works too, every node below reads the global
+    # depth 1 always finishes so there is a move to play
+    if nodes & 255==0 and search_depth>1:
+        check_budget()
+    if valid_moves is not None and len(valid_moves)==0:
+        return turn_multiplier*score_board(game_state,ply)
+    # the root still needs a move even in a drawn position
+    if ply!=0 and game_state.halfmove_clock>=100:
+        # a mate on the hundredth halfmove still counts, valid_moves was already checked when given
+        if valid_moves is None and game_state.is_in_check() and not game_state.get_valid_moves():
+            return -CHECKMATE+ply
+        return DRAW
+    if ply!=0 and game_state.is_repetition(search_root_ply):
+        return DRAW
+    if USE_BITBASES and ply!=0:
+        # a capture or promotion into a known ending is decided here, inside one only draws are final
+        score = bitbase_score(game_state,turn_multiplier,ply)
+        if score is not None and (score==DRAW or not search_root_bitbase):
+            return score
     if depth==0:
-        return turn_multiplier*score_board(game_state)
+        if QUIESCENCE:
+            return quiescence_search(game_state,alpha,beta,turn_multiplier,0,ply)
+        if valid_moves is None:
+            game_state.get_valid_moves()  # sets the checkmate and stalemate flags score_board reads
+        return turn_multiplier*score_board(game_state,ply)
+
+    # Transposition table, never cut at the root since next_move has to be set there
+    alpha_original = alpha
+    tt_move_code = 0
+    entry = transposition_table.probe(game_state.zobrist_key)
+    if entry is not None:
+        tt_depth,tt_score,tt_bound,tt_move_code = entry
+        tt_score = score_from_table(tt_score,ply)
+        if tt_depth>=depth and ply!=0:
+            if tt_bound==EXACT:
+                return tt_score
+            elif tt_bound==LOWER_BOUND:
+                alpha = max(alpha,tt_score)
+            else:
+                beta = min(beta,tt_score)
+            if alpha>=beta:
+                return tt_score
+    in_check = (NULL_MOVE or LMR) and game_state.is_in_check()
+    if NULL_MOVE and null_allowed and ply!=0 and depth>=NULL_MOVE_MIN_DEPTH and not in_check and abs(beta)<MATE_THRESHOLD:
+        if turn_multiplier*evaluate(game_state)>=beta and has_non_pawn_material(game_state):
+            score = null_move_search(game_state,depth,beta,turn_multiplier,ply)
+            if score>=beta:
+                # a mate found after passing isn't a real one
+                return beta if score>=MATE_THRESHOLD else score
+
+    if valid_moves is None:
+        moves = move_orderer.staged_moves(game_state,tt_move_code,ply)
+    else:
+        moves = move_orderer.order_moves(valid_moves,tt_move_code,ply)
+
     max_score = -CHECKMATE
-    for move in valid_moves:
+    best_move = None
+    move_count = 0
+    for move_index,move in enumerate(moves):
+        move_count += 1
         game_state.make_move(move)
-        opponent_moves = game_state.get_valid_moves()
+        opponent_moves = None if STAGED_MOVES else game_state.get_valid_moves()
+        
+        reduction = 0
+        if LMR and depth>=LMR_MIN_DEPTH and move_index>=LMR_FULL_MOVES and not in_check and not move.is_capture and not move.can_promote_pawn:
+            if not game_state.is_in_check():
+                reduction = min(LMR_REDUCTIONS[min(depth,63)][min(move_index,63)],depth-2)
         
         # - in score, best score of opponent is worst for us
-        score = -find_move_nega_max_alpha_beta(game_state,opponent_moves,depth-1,-beta,-alpha,-turn_multiplier)
+        score = None
+        if reduction>0:
+            score = -find_move_nega_max_alpha_beta(game_state,opponent_moves,depth-1-reduction,-alpha-1,-alpha,-turn_multiplier,ply+1)
+            if score>alpha:
+                score = None  # the reduced search thinks the move is good, check at full depth
+        if score is None:
+            if PVS and move_index>0:
+                score = -find_move_nega_max_alpha_beta(game_state,opponent_moves,depth-1,-alpha-1,-alpha,-turn_multiplier,ply+1)
+                if alpha<score<beta:
+                    score = -find_move_nega_max_alpha_beta(game_state,opponent_moves,depth-1,-beta,-alpha,-turn_multiplier,ply+1)
+            else:
+                score = -find_move_nega_max_alpha_beta(game_state,opponent_moves,depth-1,-beta,-alpha,-turn_multiplier,ply+1)
         
         if score>max_score:
             max_score = score
-            if depth==DEPTH:
+            best_move = move
+            if ply==0:
                 next_move = move
         
         game_state.undo_move()
@@ -128,5 +465,71 @@ def find_move_nega_max_alpha_beta(game_state:GameState,valid_moves,depth,alpha,b
              alpha = max_score
         
         if alpha>=beta:
+            move_orderer.record_cutoff(move,depth,ply,move_index,tt_move_code)
             break
+
+    if move_count==0:
+        # the staged generator came up empty, checkmate or stalemate
+        return -CHECKMATE+ply if game_state.in_check else STALEMATE
+    if max_score<=alpha_original:
+        bound = UPPER_BOUND
+    elif max_score>=beta:
+        bound = LOWER_BOUND
+    else:
+        bound = EXACT
+    transposition_table.store(game_state.zobrist_key,depth,score_to_table(max_score,ply),bound,encode_move(best_move))
     return max_score
+
+# Quiescence search, only captures are searched so the position is scored once it is quiet
+def quiescence_search(game_state:GameState,alpha,beta,turn_multiplier,q_depth = 0,ply = 0):
+    global nodes
+    nodes += 1
+    if nodes & 255==0 and search_depth>1:
+        check_budget()
+    if USE_BITBASES:
+        score = bitbase_score(game_state,turn_multiplier,ply)
+        if score is not None:
+            return score
+    in_check = game_state.is_in_check()
+    if in_check:
+        # no standing pat in check, every evasion is searched
+        moves = game_state.get_valid_moves()
+        if len(moves)==0:
+            return -CHECKMATE+ply
+        stand_pat = -CHECKMATE
+    else:
+        stand_pat = turn_multiplier*evaluate(game_state)
+        if stand_pat>=beta or q_depth>=MAX_QUIESCENCE_DEPTH:
+            return stand_pat
+        # delta pruning, not even winning a queen gets us to alpha
+        if stand_pat+PIECE_VALUES['Q']+DELTA_MARGIN<alpha:
+            return stand_pat
+        moves = game_state.get_capture_moves()
+        if QUIESCENCE_CHECKS and q_depth==0:
+            moves = moves+[move for move in game_state.get_valid_moves() if move not in moves and gives_check(game_state,move)]
+        if alpha<stand_pat:
+            alpha = stand_pat
+
+    # plain MVV-LVA, the killers and cutoff counters belong to the main search
+    moves.sort(key=move_orderer.capture_score,reverse=True)
+    max_score = stand_pat
+    for move in moves:
+        if not in_check and not move.can_promote_pawn and move.piece_captured!='--':
+            if stand_pat+PIECE_VALUES[move.piece_captured[1]]+DELTA_MARGIN<alpha:
+                continue
+        game_state.make_move(move)
+        score = -quiescence_search(game_state,-beta,-alpha,-turn_multiplier,q_depth+1,ply+1)
+        game_state.undo_move()
+        if score>max_score:
+            max_score = score
+            if score>alpha:
+                alpha = score
+            if alpha>=beta:
+                break
+    return max_score
+
+def gives_check(game_state:GameState,move):
+    game_state.make_move(move)
+    check = game_state.is_in_check()
+    game_state.undo_move()
+    return check
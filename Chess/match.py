@@ -0,0 +1,249 @@
+"""
+Headless self-play matches between two engine configurations. Games are spread over a process pool, every opening is
+played twice with the colours swapped, and the result is reported as win/draw/loss, an Elo difference with a 95% error
+bar and an SPRT verdict so a match can stop as soon as the answer is clear.
+python match.py --engine-a new:depth=3 --engine-b old:depth=3,QUIESCENCE=False --games 200 --sprt 0 10
+"""
+import argparse
+import ast
+import math
+import os
+from multiprocessing import Pool
+
+import engine
+import game_ai
+from chess_engine import GameState
+from move_ordering import MoveOrderer
+
+# balanced openings given as moves from the start position, each one is played once with each colour
+OPENINGS = [
+    "e2e4 e7e5 g1f3 b8c6 f1b5",
+    "e2e4 c7c5 g1f3 d7d6 d2d4 c5d4 f3d4 g8f6 b1c3",
+    "e2e4 e7e6 d2d4 d7d5 b1c3 g8f6",
+    "e2e4 c7c6 d2d4 d7d5 e4e5 c8f5",
+    "d2d4 d7d5 c2c4 e7e6 b1c3 g8f6",
+    "d2d4 g8f6 c2c4 g7g6 b1c3 f8g7 e2e4 d7d6",
+    "d2d4 g8f6 c2c4 e7e6 g1f3 b7b6",
+    "c2c4 e7e5 b1c3 g8f6 g1f3 b8c6",
+    "g1f3 d7d5 g2g3 g8f6 f1g2 c7c6",
+    "e2e4 d7d5 e4d5 d8d5 b1c3 d5a5",
+    "e2e4 e7e5 g1f3 g8f6 f3e5 d7d6 e5f3 f6e4",
+    "d2d4 d7d5 c2c4 c7c6 g1f3 g8f6 b1c3 d5c4",
+]
+MAX_PLIES = 300  # longer games are adjudicated as draws
+SEARCH_KEYS = ("depth", "time", "nodes")
+
+# per process: the transposition table and move orderer of every engine, and game_ai's own values of the options
+engine_tables = {}
+option_defaults = {}
+
+
+def parse_engine(spec):
+    """
+    Parses "name:key=value,key=value" into an engine config. depth, time (seconds per move) and nodes set the search
+    budget, any other key names a game_ai setting such as QUIESCENCE or TT_SIZE_MB.
+    """
+    name, _, options_text = spec.partition(":")
+    config = {"name": name or spec, "options": {}}
+    for option in filter(None, options_text.split(",")):
+        key, _, value = option.partition("=")
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            pass  # plain strings don't need quotes
+        if key in SEARCH_KEYS:
+            config[key] = value
+        elif hasattr(game_ai, key):
+            config["options"][key] = value
+        else:
+            raise ValueError("Unknown engine option %r in %r" % (key, spec))
+    if not any(key in config for key in SEARCH_KEYS):
+        config["depth"] = game_ai.DEPTH
+    return config
+
+
+def use_engine(config):
+    """
+    Switches game_ai to config: its options, and its own transposition table and move orderer so the two engines never
+    share search knowledge.
+    """
+    for key, value in option_defaults.items():
+        setattr(game_ai, key, value)
+    for key, value in config["options"].items():
+        option_defaults.setdefault(key, getattr(game_ai, key))
+        setattr(game_ai, key, value)
+    if config["name"] not in engine_tables:
+        engine_tables[config["name"]] = (None, MoveOrderer(game_ai.piece_scores))
+    game_ai.transposition_table, game_ai.move_orderer = engine_tables[config["name"]]
+
+
+def insufficient_material(game_state):
+    # no pawns, rooks or queens and at most one minor piece each, neither side can mate
+    bitboards = game_state.bitboards
+    for piece in ("wP", "bP", "wR", "bR", "wQ", "bQ"):
+        if bitboards[piece]:
+            return False
+    for color in "wb":
+        if bin(bitboards[color + "N"] | bitboards[color + "B"]).count("1") > 1:
+            return False
+    return True
+
+
+def play_game(white, black, opening, max_plies=MAX_PLIES):
+    """
+    Plays one game from opening (moves in notation from the start position, or a FEN) and returns
+    {white, black, opening, result, reason, plies} with result "1-0", "0-1" or "1/2-1/2".
+    """
+    if "/" in opening:
+        game_state = GameState(fen=opening)
+    else:
+        game_state = GameState()
+        for notation in opening.split():
+            engine.play_move(game_state, notation)
+    result = {"white": white["name"], "black": black["name"], "opening": opening, "result": "1/2-1/2", "reason": "max plies"}
+    for ply in range(max_plies):
+        valid_moves = game_state.get_valid_moves()
+        if game_state.in_check_mate:
+            result["result"], result["reason"] = ("0-1" if game_state.white_to_move else "1-0"), "checkmate"
+            break
+        if game_state.in_stale_mate:
+            result["reason"] = "stalemate"
+            break
+        if game_state.halfmove_clock >= 100:
+            result["reason"] = "fifty moves"
+            break
+        if game_state.repetition_count() >= 3:
+            result["reason"] = "repetition"
+            break
+        if insufficient_material(game_state):
+            result["reason"] = "insufficient material"
+            break
+        config = white if game_state.white_to_move else black
+        use_engine(config)
+        search_result = engine.search(
+            game_state, time_limit=config.get("time"), node_limit=config.get("nodes"), depth=config.get("depth")
+        )
+        # the table is only built on the engine's first search, keep it for its next move
+        engine_tables[config["name"]] = (game_ai.transposition_table, game_ai.move_orderer)
+        move = search_result["move"] or valid_moves[0]
+        game_state.make_move(move)
+    result["plies"] = len(game_state.move_log)
+    return result
+
+
+def play_game_star(args):
+    return play_game(*args)
+
+
+def elo_from_score(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return 400 * math.log10(score / (1 - score))
+
+
+def score_from_elo(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def match_stats(wins, draws, losses, elo0=0.0, elo1=5.0, alpha=0.05, beta=0.05):
+    """
+    Elo difference of engine A with its 95% error bar, and the log likelihood ratio of the SPRT elo0 against elo1
+    (normal approximation of the trinomial game results). The test passes once llr >= upper and fails at llr <= lower.
+    """
+    games = wins + draws + losses
+    stats = {"games": games, "wins": wins, "draws": draws, "losses": losses, "lower": math.log(beta / (1 - alpha)),
+             "upper": math.log((1 - beta) / alpha), "llr": 0.0, "elo": 0.0, "elo_error": float("inf")}
+    if games == 0:
+        return stats
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance == 0:
+        # every game ended the same way, half a win and half a loss more keep the error bar and the LLR defined
+        variance = (0.5 * (1 - score) ** 2 + 0.5 * score ** 2) / (games + 1)
+    stats["score"] = score
+    stats["elo"] = elo_from_score(score)
+    margin = 1.96 * math.sqrt(variance / games)
+    stats["elo_error"] = (elo_from_score(score + margin) - elo_from_score(score - margin)) / 2
+    score0, score1 = score_from_elo(elo0), score_from_elo(elo1)
+    stats["llr"] = games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+    return stats
+
+
+def sprt_verdict(stats):
+    if stats["llr"] >= stats["upper"]:
+        return "H1 accepted"
+    if stats["llr"] <= stats["lower"]:
+        return "H0 accepted"
+    return None
+
+
+def run_match(engine_a, engine_b, games=100, openings=None, processes=None, sprt=None, max_plies=MAX_PLIES, report=None):
+    """
+    Plays up to games games between two engine configs (see parse_engine). Openings are played in order, each once with
+    engine A as white and once as black. sprt=(elo0, elo1) stops the match as soon as the test is decided.
+    report is called with (game result, stats) after every game. Returns the final stats from engine A's point of view.
+    """
+    openings = openings or OPENINGS
+    tasks = []
+    for i in range(games):
+        opening = openings[(i // 2) % len(openings)]
+        tasks.append((engine_a, engine_b, opening, max_plies) if i % 2 == 0 else (engine_b, engine_a, opening, max_plies))
+    elo0, elo1 = sprt if sprt is not None else (0.0, 5.0)
+    wins = draws = losses = 0
+    stats = match_stats(0, 0, 0, elo0, elo1)
+    with Pool(processes or os.cpu_count() or 1) as pool:
+        for game in pool.imap_unordered(play_game_star, tasks):
+            a_is_white = game["white"] == engine_a["name"]
+            if game["result"] == "1/2-1/2":
+                draws += 1
+            elif (game["result"] == "1-0") == a_is_white:
+                wins += 1
+            else:
+                losses += 1
+            stats = match_stats(wins, draws, losses, elo0, elo1)
+            if report is not None:
+                report(game, stats)
+            if sprt is not None and sprt_verdict(stats) is not None:
+                pool.terminate()
+                break
+    stats["sprt"] = sprt_verdict(stats) if sprt is not None else None
+    return stats
+
+
+def read_openings(path):
+    with open(path) as openings:
+        return [line.strip() for line in openings if line.strip() and not line.startswith("#")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a self-play match between two engine configurations.")
+    parser.add_argument("--engine-a", default="a:depth=2", help='"name:key=value,..." e.g. new:depth=3,QUIESCENCE=False')
+    parser.add_argument("--engine-b", default="b:depth=1")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--openings", help="file with one FEN or move list per line, a built in set by default")
+    parser.add_argument("--processes", type=int, default=None, help="parallel games, all cores by default")
+    parser.add_argument("--sprt", nargs=2, type=float, metavar=("ELO0", "ELO1"), help="stop early on an SPRT verdict")
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES)
+    parser.add_argument("--verbose", action="store_true", help="print every game")
+    args = parser.parse_args()
+    engine_a, engine_b = parse_engine(args.engine_a), parse_engine(args.engine_b)
+    if engine_a["name"] == engine_b["name"]:
+        parser.error("the two engines need different names")
+
+    def report(game, stats):
+        if args.verbose:
+            print("{} vs {}: {} ({}, {} plies)".format(game["white"], game["black"], game["result"], game["reason"], game["plies"]))
+        print("\r{} games +{} ={} -{}  elo {:+.1f} +/- {:.1f}  llr {:.2f} [{:.2f}, {:.2f}]".format(
+            stats["games"], stats["wins"], stats["draws"], stats["losses"], stats["elo"], stats["elo_error"],
+            stats["llr"], stats["lower"], stats["upper"]), end="\n" if args.verbose else "", flush=True)
+
+    openings = read_openings(args.openings) if args.openings else None
+    stats = run_match(engine_a, engine_b, args.games, openings, args.processes, args.sprt, args.max_plies, report)
+    print()
+    print("{} vs {}: +{} ={} -{}, elo {:+.1f} +/- {:.1f}".format(
+        engine_a["name"], engine_b["name"], stats["wins"], stats["draws"], stats["losses"], stats["elo"], stats["elo_error"]))
+    if stats["sprt"]:
+        print("SPRT({:g}, {:g}): {}".format(args.sprt[0], args.sprt[1], stats["sprt"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Move ordering for the alpha beta search: hash move first, then captures by MVV-LVA, then killer moves, then quiet moves
+by history score. Also keeps counters on how often the ordering produces early cutoffs.
+staged_moves hands out the same order lazily, generating each group of moves only when the search gets to it.
+"""
+from transposition import encode_move
+
+TT_MOVE_SCORE = 1000000
+CAPTURE_SCORE = 100000
+KILLER_SCORES = (90000, 80000)
+HISTORY_LIMIT = 50000  # history scores are halved once one reaches this, keeps quiet moves below the killers
+MAX_PLY = 128
+
+
+class MoveOrderer:
+    def __init__(self, piece_scores):
+        self.piece_scores = piece_scores
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = {}  # (piece, dst square) -> score
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.nodes = 0  # nodes whose moves were ordered
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.cutoffs_by_kind = {"tt": 0, "capture": 0, "killer": 0, "quiet": 0}
+
+    def new_search(self):
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        for key in self.history:
+            self.history[key] //= 2
+        self.reset_stats()
+
+    def move_kind(self, move, tt_move_code, ply):
+        if tt_move_code and encode_move(move) == tt_move_code:
+            return "tt"
+        if move.is_capture or move.can_promote_pawn:
+            return "capture"
+        if ply < MAX_PLY and move in self.killers[ply]:
+            return "killer"
+        return "quiet"
+
+    def capture_score(self, move):
+        """
+        MVV-LVA rank of a capture or promotion, 0 for a quiet move. Leaves the counters and killers alone, so the
+        quiescence search sorts with it directly.
+        """
+        if not (move.is_capture or move.can_promote_pawn):
+            return 0
+        # most valuable victim, least valuable attacker
+        score = CAPTURE_SCORE + self.piece_scores[move.piece_captured[1]] * 100 - self.piece_scores[move.piece_moved[1]] if move.piece_captured != "--" else CAPTURE_SCORE
+        if move.can_promote_pawn:
+            score += self.piece_scores[move.promotion_piece] * 100
+        return score
+
+    def score_move(self, move, tt_move_code, ply):
+        if tt_move_code and encode_move(move) == tt_move_code:
+            return TT_MOVE_SCORE
+        if move.is_capture or move.can_promote_pawn:
+            return self.capture_score(move)
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if move == killers[0]:
+                return KILLER_SCORES[0]
+            if move == killers[1]:
+                return KILLER_SCORES[1]
+        return self.history.get((move.piece_moved, move.dst_sq), 0)
+
+    def order_moves(self, moves, tt_move_code=0, ply=0):
+        """
+        Sorts moves in place, best first. The sort is stable so ties keep their incoming order.
+        """
+        self.nodes += 1
+        moves.sort(key=lambda move: self.score_move(move, tt_move_code, ply), reverse=True)
+        return moves
+
+    def is_losing_capture(self, game_state, move):
+        # gives up a more valuable piece for a cheaper one on a square the opponent defends
+        if move.can_promote_pawn or not move.is_capture:
+            return False
+        if self.piece_scores[move.piece_captured[1]] >= self.piece_scores[move.piece_moved[1]]:
+            return False
+        return game_state.square_under_attack(move.dst_row, move.dst_col)
+
+    def staged_moves(self, game_state, tt_move_code=0, ply=0):
+        """
+        Generator over the legal moves of game_state in stages: hash move, winning captures, killers, quiet moves by
+        history, losing captures. A stage is only generated once the one before is used up, so a cutoff on the hash
+        move or a capture never pays for the quiet moves. The hash move and killers are checked for legality on their
+        own. game_state has to be back in the same position every time the generator resumes.
+        """
+        self.nodes += 1
+        hash_move = game_state.get_legal_move(tt_move_code) if tt_move_code else None
+        if hash_move is not None:
+            yield hash_move
+        captures = game_state.get_capture_moves()
+        captures.sort(key=lambda move: self.score_move(move, 0, ply), reverse=True)
+        losing_captures = []
+        for move in captures:
+            if move == hash_move:
+                continue
+            if self.is_losing_capture(game_state, move):
+                losing_captures.append(move)
+                continue
+            yield move
+        killers = []
+        if ply < MAX_PLY:
+            for killer in self.killers[ply]:
+                if killer is not None and killer != hash_move and game_state.is_legal_move(killer):
+                    killers.append(killer)
+                    yield killer
+        quiet_moves = game_state.get_quiet_moves()
+        history = self.history
+        quiet_moves.sort(key=lambda move: history.get((move.piece_moved, move.dst_sq), 0), reverse=True)
+        for move in quiet_moves:
+            if move != hash_move and move not in killers:
+                yield move
+        yield from losing_captures
+
+    def record_cutoff(self, move, depth, ply, move_index, tt_move_code=0):
+        """
+        Called when move caused a beta cutoff, quiet moves become killers and earn history.
+        """
+        self.cutoffs += 1
+        if move_index == 0:
+            self.first_move_cutoffs += 1
+        kind = self.move_kind(move, tt_move_code, ply)
+        self.cutoffs_by_kind[kind] += 1
+        if move.is_capture or move.can_promote_pawn:
+            return
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if move != killers[0]:
+                killers[1] = killers[0]
+                killers[0] = move
+        key = (move.piece_moved, move.dst_sq)
+        self.history[key] = self.history.get(key, 0) + depth * depth
+        if self.history[key] >= HISTORY_LIMIT:
+            for key in self.history:
+                self.history[key] //= 2
+
+    def stats(self):
+        return {
+            "nodes": self.nodes,
+            "cutoffs": self.cutoffs,
+            "cutoff_rate": self.cutoffs / self.nodes if self.nodes else 0.0,
+            "first_move_cutoff_rate": self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0,
+            "cutoffs_by_kind": dict(self.cutoffs_by_kind),
+        }
@@ -0,0 +1,77 @@
+"""
+Opening book in a Polyglot style file: 16 byte entries of key, move, weight and learn, big endian and sorted by key.
+The file is read through mmap and searched by bisection, so it is never loaded as a whole. Keys are this engine's
+zobrist keys and moves are Move.move_id, so books are built with book_builder.py rather than taken from other programs.
+"""
+import mmap
+import os
+import random
+import struct
+
+ENTRY = struct.Struct(">QHHI")
+KEY = struct.Struct(">Q")
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.entries = os.fstat(self.file.fileno()).st_size // ENTRY.size
+        # an empty file can't be mapped
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.entries else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    def find_entries(self, key):
+        """
+        [(move_id, weight)] stored under key, found by binary search over the mapped file.
+        """
+        low, high = 0, self.entries
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(self.map, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.entries:
+            entry_key, move_id, weight, _ = ENTRY.unpack_from(self.map, low * ENTRY.size)
+            if entry_key != key:
+                break
+            entries.append((move_id, weight))
+            low += 1
+        return entries
+
+    def get_moves(self, game_state, valid_moves=None):
+        """
+        [(move, weight)] of the book moves legal in game_state, heaviest first.
+        """
+        if valid_moves is None:
+            valid_moves = game_state.get_valid_moves()
+        moves_by_id = {move.move_id: move for move in valid_moves}
+        moves = [
+            (moves_by_id[move_id], weight) for move_id, weight in self.find_entries(game_state.zobrist_key)
+            if move_id in moves_by_id and weight > 0
+        ]
+        moves.sort(key=lambda entry: entry[1], reverse=True)
+        return moves
+
+    def choose_move(self, game_state, valid_moves=None, rng=random):
+        """
+        A book move picked with a chance proportional to its weight, None when the position isn't in the book.
+        """
+        moves = self.get_moves(game_state, valid_moves)
+        if not moves:
+            return None
+        return rng.choices([move for move, _ in moves], weights=[weight for _, weight in moves])[0]
+
@@ -0,0 +1,89 @@
+"""
+Parallel root search. The root moves are dealt out to a pool of processes, every worker runs the iterative deepening
+search over its share and the results are merged at the deepest depth all workers completed.
+"""
+import os
+import time
+from multiprocessing import Pool
+
+import game_ai
+
+
+def search_root_moves(game_state, move_indexes, time_limit, node_limit, max_depth):
+    """
+    Worker entry point, searches only the root moves at move_indexes of game_state.get_valid_moves().
+    """
+    valid_moves = game_state.get_valid_moves()
+    moves = [valid_moves[i] for i in move_indexes]
+    game_ai.get_transposition_table().new_search()
+    game_ai.move_orderer.new_search()
+    game_ai.iterative_deepening(game_state, moves, time_limit, node_limit, max_depth=max_depth, root_share=True)
+    return game_ai.search_info
+
+
+def split_root_moves(game_state, valid_moves, workers):
+    # ordered first and dealt round robin so every worker gets a fair share of the promising moves
+    ordered = list(range(len(valid_moves)))
+    scores = {i: game_ai.move_orderer.score_move(valid_moves[i], 0, 0) for i in ordered}
+    ordered.sort(key=lambda i: scores[i], reverse=True)
+    return [ordered[worker::workers] for worker in range(workers)]
+
+
+def is_settled(iteration):
+    # the worker stopped on a mate its own search reached, see game_ai.iterative_deepening
+    plies = game_ai.mate_distance(iteration["score"])
+    return plies is not None and plies <= iteration["depth"] and iteration["score"] > 0
+
+
+def merge_results(results):
+    """
+    Picks the best move at the deepest depth every worker finished, a deeper result from one worker can't be compared
+    with a shallower one from another. A worker that stopped on a mate it found has settled its share, its last
+    iteration stands in for every deeper one.
+    """
+    open_depths = [info[-1]["depth"] for info in results if not is_settled(info[-1])]
+    depth = min(open_depths) if open_depths else max(info[-1]["depth"] for info in results)
+    best = None
+    for info in results:
+        iteration = info[min(depth, len(info)) - 1]
+        if best is None or iteration["score"] > best["score"]:
+            best = iteration
+    return depth, best
+
+
+def find_best_move_parallel(game_state, valid_moves=None, processes=None, time_limit=None, node_limit=None, max_depth=None):
+    """
+    Returns (best_move, stats). Budgets mean the same as in game_ai.find_best_move, node_limit is shared out between the
+    workers. Stats hold the merged depth, score, pv, total nodes and the depth each worker reached.
+    """
+    if valid_moves is None:
+        valid_moves = game_state.get_valid_moves()
+    if len(valid_moves) == 0:
+        return None, {}
+    if max_depth is None:
+        max_depth = game_ai.DEPTH if time_limit is None and node_limit is None else game_ai.MAX_DEPTH
+    processes = min(processes or os.cpu_count() or 1, len(valid_moves))
+    worker_node_limit = node_limit // processes if node_limit is not None else None
+    start = time.perf_counter()
+    shares = split_root_moves(game_state, valid_moves, processes)
+    with Pool(processes) as pool:
+        results = pool.starmap(
+            search_root_moves,
+            [(game_state, share, time_limit, worker_node_limit, max_depth) for share in shares],
+        )
+    depth, best = merge_results(results)
+    best_move = None
+    for move in valid_moves:
+        if move.get_chess_notation() == best["move"]:
+            best_move = move
+            break
+    stats = {
+        "depth": depth,
+        "score": best["score"],
+        "pv": best["pv"],
+        "nodes": sum(info[-1]["nodes"] for info in results),
+        "time": time.perf_counter() - start,
+        "workers": processes,
+        "worker_depths": [info[-1]["depth"] for info in results],
+    }
+    return best_move, stats
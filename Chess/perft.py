@@ -0,0 +1,157 @@
+"""
+Perft, the move generator correctness check: counts the leaf nodes of the legal move tree to a fixed depth and compares
+them with the published counts for a set of reference positions.
+Run python perft.py --suite for the whole suite, or --fen/--depth/--divide for a single position.
+"""
+import argparse
+import time
+
+from chess_engine import GameState
+
+# (name, fen, {depth: leaf nodes}), counts from the chess programming wiki perft results page
+PERFT_SUITE = [
+    (
+        "startpos",
+        "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+        {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609},
+    ),
+    (
+        "kiwipete",
+        "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+        {1: 48, 2: 2039, 3: 97862, 4: 4085603},
+    ),
+    (
+        "position3",
+        "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+        {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624},
+    ),
+    (
+        "position4",
+        "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+        {1: 6, 2: 264, 3: 9467, 4: 422333},
+    ),
+    (
+        "position5",
+        "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+        {1: 44, 2: 1486, 3: 62379, 4: 2103487},
+    ),
+    (
+        "position6",
+        "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+        {1: 46, 2: 2079, 3: 89890, 4: 3894594},
+    ),
+    (
+        # not from the wiki: the white f4 pawn is pinned on its file and may still push to f5 towards its king, the
+        # board array generator once missed that, the counts are the bitboard generator's
+        "filepin",
+        "3Q2B1/1k5p/4BKbP/8/1Pp2P2/1p6/1B6/5r2 w - - 3 94",
+        {1: 38, 2: 649, 3: 23917, 4: 415759},
+    ),
+]
+SUITE_DEPTH = 3  # deepest depth run_suite checks by default, every position finishes in seconds up to here
+
+
+def perft(game_state, depth):
+    """
+    Number of leaf nodes depth plies below game_state. The last ply is counted without being played.
+    """
+    valid_moves = game_state.get_valid_moves()
+    if depth <= 1:
+        return len(valid_moves) if depth == 1 else 1
+    nodes = 0
+    for move in valid_moves:
+        game_state.make_move(move)
+        nodes += perft(game_state, depth - 1)
+        game_state.undo_move()
+    return nodes
+
+
+def divide(game_state, depth):
+    """
+    Perft split by root move, returns {move notation: leaf nodes}. Comparing this with another engine's divide output
+    points straight at the move whose subtree is wrong.
+    """
+    counts = {}
+    for move in game_state.get_valid_moves():
+        game_state.make_move(move)
+        counts[move.get_chess_notation()] = perft(game_state, depth - 1)
+        game_state.undo_move()
+    return counts
+
+
+def run_perft(fen, depth, use_bitboards=True):
+    """
+    Runs perft on fen and returns {fen, depth, nodes, time, nps}.
+    """
+    game_state = GameState(use_bitboards=use_bitboards, fen=fen)
+    start = time.perf_counter()
+    nodes = perft(game_state, depth)
+    elapsed = time.perf_counter() - start
+    return {"fen": fen, "depth": depth, "nodes": nodes, "time": elapsed, "nps": nodes / elapsed if elapsed > 0 else 0.0}
+
+
+def run_suite(max_depth=SUITE_DEPTH, use_bitboards=True, report=None):
+    """
+    Runs every suite position at every listed depth up to max_depth. Returns one result dict per run with the name,
+    the expected count and whether it matched, report is called with each result as soon as it is ready.
+    """
+    results = []
+    for name, fen, expected_counts in PERFT_SUITE:
+        for depth, expected in sorted(expected_counts.items()):
+            if depth > max_depth:
+                break
+            result = run_perft(fen, depth, use_bitboards)
+            result["name"] = name
+            result["expected"] = expected
+            result["passed"] = result["nodes"] == expected
+            results.append(result)
+            if report is not None:
+                report(result)
+    return results
+
+
+def print_result(result):
+    status = "" if "passed" not in result else ("ok    " if result["passed"] else "FAILED")
+    expected = " expected {}".format(result["expected"]) if "expected" in result else ""
+    print(
+        "{} {:<10} depth {} nodes {:>9}{} {:.2f}s {:,.0f} nps".format(
+            status, result.get("name", ""), result["depth"], result["nodes"], expected, result["time"], result["nps"]
+        ).strip()
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count move generator leaf nodes.")
+    parser.add_argument("--fen", default=PERFT_SUITE[0][1], help="position to count from, the start position by default")
+    parser.add_argument("--depth", type=int, default=SUITE_DEPTH)
+    parser.add_argument("--divide", action="store_true", help="print the node count below every root move")
+    parser.add_argument("--suite", action="store_true", help="check every reference position up to --depth")
+    parser.add_argument("--mailbox", action="store_true", help="use the board array generator instead of bitboards")
+    args = parser.parse_args()
+    use_bitboards = not args.mailbox
+
+    if args.suite:
+        results = run_suite(args.depth, use_bitboards, report=print_result)
+        failed = [result for result in results if not result["passed"]]
+        nodes = sum(result["nodes"] for result in results)
+        elapsed = sum(result["time"] for result in results)
+        print("{} of {} passed, {} nodes in {:.2f}s, {:,.0f} nps".format(
+            len(results) - len(failed), len(results), nodes, elapsed, nodes / elapsed if elapsed > 0 else 0.0))
+        raise SystemExit(1 if failed else 0)
+
+    if args.divide:
+        game_state = GameState(use_bitboards=use_bitboards, fen=args.fen)
+        start = time.perf_counter()
+        counts = divide(game_state, args.depth)
+        elapsed = time.perf_counter() - start
+        for notation in sorted(counts):
+            print("{}: {}".format(notation, counts[notation]))
+        nodes = sum(counts.values())
+        print("\nmoves {} nodes {} {:.2f}s {:,.0f} nps".format(len(counts), nodes, elapsed, nodes / elapsed if elapsed > 0 else 0.0))
+        return
+
+    print_result(run_perft(args.fen, args.depth, use_bitboards))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Just enough PGN for building opening books: games are split into their tag pairs and SAN moves, comments, variations
+and annotations are dropped, and SAN is matched against the legal moves of a GameState.
+"""
+import re
+
+TAG_PATTERN = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+COMMENT_PATTERN = re.compile(r"\{[^}]*\}|;[^\n]*")
+MOVE_NUMBER_PATTERN = re.compile(r"^\d+\.+")
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+
+def strip_variations(text):
+    # variations nest, so they are cut out by depth rather than with a pattern
+    kept = []
+    depth = 0
+    for char in text:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth = max(depth - 1, 0)
+        elif depth == 0:
+            kept.append(char)
+    return "".join(kept)
+
+
+def parse_movetext(text):
+    """
+    The SAN moves of a game's movetext, without move numbers, comments, variations, NAGs or the result.
+    """
+    moves = []
+    for token in strip_variations(COMMENT_PATTERN.sub(" ", text)).split():
+        token = MOVE_NUMBER_PATTERN.sub("", token)
+        if not token or token in RESULTS or token.startswith("$"):
+            continue
+        moves.append(token)
+    return moves
+
+
+def read_games(lines):
+    """
+    Generator over (tags, san_moves) for every game in lines (any iterable of strings, e.g. an open PGN file).
+    """
+    tags = {}
+    movetext = []
+    for line in lines:
+        match = TAG_PATTERN.match(line.strip())
+        if match:
+            if movetext:
+                yield tags, parse_movetext(" ".join(movetext))
+                tags, movetext = {}, []
+            tags[match.group(1)] = match.group(2)
+        elif line.strip():
+            movetext.append(line)
+    if movetext or tags:
+        yield tags, parse_movetext(" ".join(movetext))
+
+
+def find_san_move(game_state, san, valid_moves=None):
+    """
+    The legal move written as san (Nbd2, exd5, e8=Q+, O-O) in game_state, or None when no single move fits.
+    """
+    if valid_moves is None:
+        valid_moves = game_state.get_valid_moves()
+    san = san.rstrip("+#!?")
+    if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        dst_col = 6 if len(san) == 3 else 2
+        for move in valid_moves:
+            if move.is_castle_move and move.dst_col == dst_col:
+                return move
+        return None
+    promotion = None
+    if "=" in san:
+        san, promotion = san.split("=", 1)
+    elif san[-1:] in "QRBN" and len(san) > 2 and san[-2].isdigit():
+        san, promotion = san[:-1], san[-1]
+    if len(san) < 2 or san[-2] not in "abcdefgh" or san[-1] not in "12345678":
+        return None
+    piece = san[0] if san[0] in "NBRQK" else "P"
+    dst_row, dst_col = 8 - int(san[-1]), "abcdefgh".index(san[-2])
+    # whatever is left between the piece and the destination tells apart two pieces that can go there
+    hint = san[1 if piece != "P" else 0:-2].replace("x", "")
+    found = None
+    for move in valid_moves:
+        if move.piece_moved[1] != piece or move.dst_row != dst_row or move.dst_col != dst_col:
+            continue
+        if move.can_promote_pawn and move.promotion_piece != (promotion or "Q").upper():
+            continue
+        source = move.get_rank_file(move.src_row, move.src_col)
+        if any(char not in source for char in hint):
+            continue
+        if found is not None:
+            return None  # ambiguous
+        found = move
+    return found
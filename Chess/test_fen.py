@@ -0,0 +1,29 @@
+"""
+GameState.load_fen rejects a bad FEN with ValueError and leaves the position it had untouched.
+"""
+import pytest
+
+from chess_engine import GameState
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+INVALID_FENS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w KQkq - 0 1",  # seven ranks
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq - 0 1",  # side to move
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e9 0 1",  # en passant off the board
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq z3 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KXkq - 0 1",  # castling
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - x 1",  # move clock
+    "8/8/8/8/8/8/8/7k w - - 0 1",  # no white king
+    "P3k3/8/8/8/8/8/8/4K3 w - - 0 1",  # pawn on the last rank
+    "4k3/8/8/8/8/8/8/4K2p b - - 0 1",  # pawn on the first rank
+    "8/8/8/3k4/8/8/8/3QK3 w - - 0 1",  # the side not to move is in check
+]
+
+
+@pytest.mark.parametrize("fen", INVALID_FENS)
+def test_invalid_fen_raises_and_keeps_the_position(fen):
+    game_state = GameState(fen=START_FEN)
+    with pytest.raises(ValueError):
+        game_state.load_fen(fen)
+    assert game_state.get_fen() == START_FEN
+    assert len(game_state.get_valid_moves()) == 20
@@ -0,0 +1,27 @@
+"""
+match_stats has to give a finite error bar and an SPRT verdict even when every game ended the same way.
+"""
+import math
+
+from match import match_stats, sprt_verdict
+
+
+def test_all_wins_accepts_h1():
+    stats = match_stats(40, 0, 0, 0.0, 10.0)
+    assert stats["llr"] > 0
+    assert math.isfinite(stats["elo_error"])
+    assert sprt_verdict(stats) == "H1 accepted"
+
+
+def test_all_losses_accepts_h0():
+    stats = match_stats(0, 0, 40, 0.0, 10.0)
+    assert stats["llr"] < 0
+    assert math.isfinite(stats["elo_error"])
+    assert sprt_verdict(stats) == "H0 accepted"
+
+
+def test_all_draws_is_defined():
+    stats = match_stats(0, 40, 0, 0.0, 10.0)
+    assert math.isfinite(stats["llr"])
+    assert math.isfinite(stats["elo_error"])
+    assert stats["elo"] == 0.0
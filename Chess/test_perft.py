@@ -0,0 +1,23 @@
+"""
+The bitboard and board array move generators have to agree move for move on the perft suite positions.
+"""
+import pytest
+
+from chess_engine import GameState
+from perft import PERFT_SUITE, divide
+
+COMPARE_DEPTH = 2
+
+
+@pytest.mark.parametrize("name,fen", [(name, fen) for name, fen, _ in PERFT_SUITE])
+def test_backends_agree(name, fen):
+    bitboard_counts = divide(GameState(use_bitboards=True, fen=fen), COMPARE_DEPTH)
+    mailbox_counts = divide(GameState(use_bitboards=False, fen=fen), COMPARE_DEPTH)
+    assert bitboard_counts == mailbox_counts
+
+
+def test_pawn_pinned_on_its_file_pushes_towards_its_king():
+    fen = "3Q2B1/1k5p/4BKbP/8/1Pp2P2/1p6/1B6/5r2 w - - 3 94"
+    for use_bitboards in (True, False):
+        moves = GameState(use_bitboards=use_bitboards, fen=fen).get_valid_moves()
+        assert "f4f5" in [move.get_chess_notation() for move in moves]
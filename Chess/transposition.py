@@ -0,0 +1,113 @@
+"""
+Fixed size transposition table for the negamax search.
+Entries live in two flat arrays of unsigned 64 bit integers (the key and a packed data word), so the memory use is
+exactly size_mb megabytes no matter how many positions are searched.
+"""
+from array import array
+
+EXACT = 0
+LOWER_BOUND = 1  # fail high, the real score is at least the stored score
+UPPER_BOUND = 2  # fail low, the real score is at most the stored score
+
+ENTRY_BYTES = 16  # 8 byte key + 8 byte data word
+SCORE_OFFSET = 1 << 23
+
+# data word layout, from the low bits up
+#  0-15 move code, 16-23 depth, 24-25 bound, 26-31 age, 32-55 score + SCORE_OFFSET
+MOVE_MASK = 0xFFFF
+DEPTH_SHIFT = 16
+BOUND_SHIFT = 24
+AGE_SHIFT = 26
+SCORE_SHIFT = 32
+
+
+def encode_move(move):
+    """
+    The 16 bit code a move is stored under, Move.move_id is already packed that way. 0 means no move.
+    """
+    if move is None:
+        return 0
+    return move.move_id
+
+
+def find_move(moves, move_code):
+    for move in moves:
+        if encode_move(move) == move_code:
+            return move
+    return None
+
+
+class TranspositionTable:
+    """
+    Two entries per bucket: the first slot is depth preferred and only gives way to a deeper search or an entry left over
+    from an older search, the second slot always takes the newest result.
+    """
+    def __init__(self, size_mb):
+        buckets = 1
+        while buckets * 2 * 2 * ENTRY_BYTES <= size_mb * 1024 * 1024:
+            buckets *= 2
+        self.size_mb = size_mb
+        self.bucket_mask = buckets - 1
+        self.keys = array("Q", bytes(buckets * 2 * 8))
+        self.data = array("Q", bytes(buckets * 2 * 8))
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def clear(self):
+        self.keys = array("Q", bytes(len(self.keys) * 8))
+        self.data = array("Q", bytes(len(self.data) * 8))
+        self.age = 0
+
+    def new_search(self):
+        self.age = (self.age + 1) & 0x3F
+        self.probes = self.hits = self.stores = 0
+
+    def memory_bytes(self):
+        return (len(self.keys) + len(self.data)) * 8
+
+    def probe(self, key):
+        """
+        Returns (depth, score, bound, move_code) for the position, or None when it is not stored.
+        """
+        self.probes += 1
+        index = (key & self.bucket_mask) << 1
+        keys = self.keys
+        if keys[index] == key:
+            data = self.data[index]
+        elif keys[index + 1] == key:
+            data = self.data[index + 1]
+        else:
+            return None
+        if data == 0:
+            return None
+        self.hits += 1
+        return (
+            (data >> DEPTH_SHIFT) & 0xFF,
+            ((data >> SCORE_SHIFT) & 0xFFFFFF) - SCORE_OFFSET,
+            (data >> BOUND_SHIFT) & 0x3,
+            data & MOVE_MASK,
+        )
+
+    def store(self, key, depth, score, bound, move_code):
+        self.stores += 1
+        index = (key & self.bucket_mask) << 1
+        old = self.data[index]
+        if old == 0 or self.keys[index] == key or depth >= (old >> DEPTH_SHIFT) & 0xFF or (old >> AGE_SHIFT) & 0x3F != self.age:
+            if self.keys[index] != key and old != 0:
+                # keep the entry being replaced around in the always replace slot
+                self.keys[index + 1] = self.keys[index]
+                self.data[index + 1] = old
+        else:
+            index += 1
+        if move_code == 0 and self.keys[index] == key:
+            move_code = self.data[index] & MOVE_MASK  # keep the best move we already knew
+        self.keys[index] = key
+        self.data[index] = (
+            move_code
+            | min(depth, 0xFF) << DEPTH_SHIFT
+            | bound << BOUND_SHIFT
+            | self.age << AGE_SHIFT
+            | (int(score) + SCORE_OFFSET) << SCORE_SHIFT
+        )
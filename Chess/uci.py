@@ -0,0 +1,226 @@
+"""
+UCI front-end, so the engine can be run by tournament managers and chess GUIs: python uci.py
+The search runs on a background thread while the main thread keeps reading commands, so stop, isready and ponderhit
+are answered straight away. Every finished iteration is reported as an info line with depth, score, nodes, nps and pv.
+"""
+import sys
+import threading
+import time
+
+import engine
+import game_ai
+from chess_engine import GameState
+
+ENGINE_NAME = "Chess-Engine"
+ENGINE_AUTHOR = "CC-KEH"
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+MOVE_OVERHEAD = 0.05  # seconds kept back on every move for the GUI and the pipe
+DEFAULT_MOVES_TO_GO = 30  # sudden death clocks are shared out as if this many moves were left
+
+
+def allocate_time(remaining, increment=0.0, moves_to_go=None):
+    """
+    Seconds to spend on this move from the clock, at most half of what is left.
+    """
+    budget = remaining / (moves_to_go or DEFAULT_MOVES_TO_GO) + increment * 0.75
+    return max(min(budget, remaining / 2) - MOVE_OVERHEAD, 0.01)
+
+
+def format_score(score):
+    plies = game_ai.mate_distance(score)
+    if plies is not None:
+        moves = (plies + 1) // 2
+        return "mate %d" % (moves if score > 0 else -moves)
+    return "cp %d" % score
+
+
+class UciEngine:
+    def __init__(self, output=None):
+        self.output = output or self.write
+        self.game_state = GameState()
+        self.search_thread = None
+        self.stop_requested = False
+        self.waiting = False  # go infinite / go ponder, bestmove has to wait for stop or ponderhit
+        self.search_start = 0.0
+        self.time_limit = None  # seconds from search_start, None while pondering or infinite
+        self.ponder_time_limit = None  # the time limit a ponderhit switches to
+        self.use_book = False  # OwnBook, tournament managers usually bring their own openings
+        game_ai.stop_condition = self.should_stop
+
+    @staticmethod
+    def write(line):
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+    def should_stop(self):
+        # polled by game_ai every 256 nodes from the search thread
+        if self.stop_requested:
+            return True
+        return self.time_limit is not None and time.perf_counter() - self.search_start >= self.time_limit
+
+    def handle(self, line):
+        """
+        Runs one command line, returns False once the engine should exit.
+        """
+        fields = line.split()
+        if not fields:
+            return True
+        command, args = fields[0], fields[1:]
+        if command == "uci":
+            self.output("id name " + ENGINE_NAME)
+            self.output("id author " + ENGINE_AUTHOR)
+            self.output("option name Hash type spin default %d min 1 max 1024" % game_ai.TT_SIZE_MB)
+            self.output("option name Ponder type check default false")
+            self.output("option name OwnBook type check default false")
+            self.output("option name BookFile type string default " + game_ai.BOOK_PATH)
+            self.output("uciok")
+        elif command == "isready":
+            self.output("readyok")
+        elif command == "setoption":
+            self.set_option(args)
+        elif command == "ucinewgame":
+            self.stop_search()
+            game_ai.get_transposition_table().clear()
+            game_ai.move_orderer.history = {}
+        elif command == "position":
+            self.stop_search()
+            self.set_position(args)
+        elif command == "go":
+            self.stop_search()
+            self.go(args)
+        elif command == "stop":
+            self.stop_search()
+        elif command == "ponderhit":
+            self.ponderhit()
+        elif command == "quit":
+            self.stop_search()
+            return False
+        return True
+
+    def set_option(self, args):
+        text = " ".join(args)
+        name, _, value = text.partition(" value ")
+        name = name.replace("name", "", 1).strip().lower()
+        if name == "hash" and value.strip().isdigit():
+            self.stop_search()
+            game_ai.TT_SIZE_MB = max(1, int(value))
+            game_ai.get_transposition_table()
+        elif name == "ownbook":
+            self.use_book = value.strip().lower() == "true"
+        elif name == "bookfile":
+            game_ai.BOOK_PATH = value.strip()
+
+    def set_position(self, args):
+        if "moves" in args:
+            moves = args[args.index("moves") + 1:]
+            args = args[:args.index("moves")]
+        else:
+            moves = []
+        if args and args[0] == "fen":
+            fen = " ".join(args[1:])
+        else:
+            fen = START_FEN
+        try:
+            self.game_state = GameState(fen=fen)
+            for notation in moves:
+                engine.play_move(self.game_state, notation)
+        except ValueError as error:
+            self.output("info string " + str(error))
+
+    def go(self, args):
+        options = {}
+        i = 0
+        while i < len(args):
+            if args[i] in ("infinite", "ponder"):
+                options[args[i]] = True
+                i += 1
+            elif i + 1 < len(args):
+                try:
+                    options[args[i]] = int(args[i + 1])
+                except ValueError:
+                    pass
+                i += 2
+            else:
+                i += 1
+        self.waiting = options.get("infinite", False) or options.get("ponder", False)
+        self.time_limit = self.get_time_limit(options)
+        if self.waiting:
+            self.ponder_time_limit = self.time_limit
+            self.time_limit = None
+        self.stop_requested = False
+        self.search_start = time.perf_counter()
+        self.search_thread = threading.Thread(
+            target=self.search, args=(options.get("depth"), options.get("nodes")), daemon=True
+        )
+        self.search_thread.start()
+
+    def get_time_limit(self, options):
+        if "movetime" in options:
+            return max(options["movetime"] / 1000 - MOVE_OVERHEAD, 0.01)
+        clock, increment = ("wtime", "winc") if self.game_state.white_to_move else ("btime", "binc")
+        if clock in options:
+            return allocate_time(options[clock] / 1000, options.get(increment, 0) / 1000, options.get("movestogo"))
+        return None  # depth, nodes or infinite only
+
+    def on_iteration(self, info):
+        elapsed = max(info["time"], 1e-6)
+        self.output("info depth %d score %s nodes %d nps %d time %d pv %s" % (
+            info["depth"], format_score(info["score"]), info["nodes"], info["nodes"] / elapsed,
+            elapsed * 1000, " ".join(info["pv"])))
+        # the next iteration costs more than all before it, don't start one that can't finish
+        if self.time_limit is not None and time.perf_counter() - self.search_start > self.time_limit / 2:
+            self.stop_requested = True
+
+    def search(self, depth, node_limit):
+        game_state = self.game_state
+        valid_moves = game_state.get_valid_moves()
+        best_move = None
+        info = None
+        if valid_moves and self.use_book:
+            best_move = game_ai.get_book_move(game_state, valid_moves)
+            if best_move is not None:
+                self.output("info string book move")
+        if valid_moves and best_move is None:
+            game_ai.get_transposition_table().new_search()
+            game_ai.move_orderer.new_search()
+            best_move = game_ai.iterative_deepening(
+                game_state, valid_moves, None, node_limit, self.on_iteration, max_depth=depth or game_ai.MAX_DEPTH
+            )
+            info = game_ai.search_info[-1] if game_ai.search_info else None
+            if best_move is None:
+                best_move = valid_moves[0]
+        # under go infinite and go ponder the answer waits for stop or ponderhit
+        while self.waiting and not self.stop_requested:
+            time.sleep(0.001)
+        if best_move is None:
+            self.output("bestmove 0000")
+        elif info is not None and len(info["pv"]) > 1:
+            self.output("bestmove %s ponder %s" % (best_move.get_chess_notation(), info["pv"][1]))
+        else:
+            self.output("bestmove " + best_move.get_chess_notation())
+
+    def ponderhit(self):
+        # the expected move was played, the ponder search goes on as a normal timed search from here
+        if self.search_thread is None or not self.waiting:
+            return
+        self.search_start = time.perf_counter()
+        self.time_limit = self.ponder_time_limit
+        self.waiting = False
+
+    def stop_search(self):
+        if self.search_thread is not None:
+            self.stop_requested = True
+            self.search_thread.join()
+            self.search_thread = None
+        self.waiting = False
+
+
+def main():
+    uci_engine = UciEngine()
+    for line in sys.stdin:
+        if not uci_engine.handle(line):
+            break
+
+
+if __name__ == "__main__":
+    main()
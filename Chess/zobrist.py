@@ -0,0 +1,41 @@
+"""
+Zobrist keys used to give every position a 64 bit identity.
+The keys come from a seeded generator so a position hashes the same in every process.
+"""
+import random
+
+_random = random.Random(20240611)
+
+PIECE_KEYS = {
+    piece: [_random.getrandbits(64) for _ in range(64)]
+    for piece in ["wP", "wN", "wB", "wR", "wQ", "wK", "bP", "bN", "bB", "bR", "bQ", "bK"]
+}
+SIDE_KEY = _random.getrandbits(64)  # xored in when black is to move
+ENPASSANT_KEYS = [_random.getrandbits(64) for _ in range(8)]  # one per file
+_WKS, _BKS, _WQS, _BQS = (_random.getrandbits(64) for _ in range(4))
+# CASTLE_KEYS[mask] where mask bits are wks, bks, wqs, bqs from low to high
+CASTLE_KEYS = [
+    (_WKS if mask & 1 else 0) ^ (_BKS if mask & 2 else 0) ^ (_WQS if mask & 4 else 0) ^ (_BQS if mask & 8 else 0)
+    for mask in range(16)
+]
+
+
+def enpassant_key(enpassant_possible):
+    return ENPASSANT_KEYS[enpassant_possible[1]] if enpassant_possible else 0
+
+
+def compute_key(game_state):
+    """
+    Hashes the position from scratch, make_move and undo_move keep the same value up to date incrementally.
+    """
+    key = 0
+    for r in range(8):
+        for c in range(8):
+            piece = game_state.board[r][c]
+            if piece != "--":
+                key ^= PIECE_KEYS[piece][r * 8 + c]
+    if not game_state.white_to_move:
+        key ^= SIDE_KEY
+    key ^= CASTLE_KEYS[game_state.castle_rights]
+    key ^= enpassant_key(game_state.enpassant_possible)
+    return key